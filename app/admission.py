@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class AdmissionController:
+    """Caps how many requests a worker holds at once, running or waiting for the model
+
+    Requests beyond ``max_pending`` are turned away immediately instead of
+    queueing behind inference until the client times out. 0 disables the cap.
+    """
+
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.max_pending and self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.pending -= 1
+
+
+class TokenBucketLimiter:
+    """Per-client token buckets refilled at ``rate`` tokens per second up to ``burst``
+
+    Only the ``max_clients`` most recently seen clients are tracked. A rate of
+    0 disables limiting.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, client):
+        """Take a token for ``client``; returns (allowed, seconds until the next token)"""
+        if self.rate <= 0:
+            return True, 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                allowed, wait = True, 0.0
+            else:
+                allowed, wait = False, (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed, wait
@@ -0,0 +1,225 @@
+import asyncio
+import contextvars
+import io
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsgiAdapter:
+    """Serve the Flask (WSGI) app from an ASGI server such as uvicorn
+
+    Request bodies are received on the event loop, so a client on a slow link
+    only costs a coroutine while it uploads. Once the body is complete the
+    WSGI app runs on a bounded thread pool that does the decode and inference;
+    at most ``max_workers`` calls are handed to it at a time, the rest wait on
+    the event loop. Bodies larger than ``spool_bytes`` are spooled to a
+    temporary file instead of being held in memory.
+    
+    ``websocket_routes`` maps a path to an async handler called as
+    ``handler(scope, receive, send, run)``, where ``await run(fn, *args)``
+    runs blocking work on the same bounded pool.
+    
+    ``admission(environ) -> (rejection, release)`` is checked on the event
+    loop before the body is received, with an environ that has no body yet.
+    A rejection (a WSGI app, e.g. a response object) is sent right away
+    without reading the upload; ``release``, if given, is called once the
+    admitted request's response has been sent.
+    """
+
+    def __init__(self, wsgi_app, max_workers=8, max_body_bytes=None, spool_bytes=8 * 1024 * 1024,
+                 websocket_routes=None, admission=None):
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.max_body_bytes = max_body_bytes
+        self.spool_bytes = spool_bytes
+        self.websocket_routes = websocket_routes or {}
+        self.admission = admission
+        self.executor = None
+        self.slots = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            await self.handle_websocket(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    def _ensure_started(self):
+        # Created lazily so each server worker process gets its own pool and event loop binding
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='wsgi')
+            self.slots = asyncio.Semaphore(self.max_workers)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._ensure_started()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.executor is not None:
+                    self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """Spooled file with the full request body, or None if the client went away or sent too much"""
+        body = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None, 0
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if self.max_body_bytes is not None and size > self.max_body_bytes:
+                body.close()
+                return None, size
+            body.write(chunk)
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body, size
+
+    async def handle_http(self, scope, receive, send):
+        self._ensure_started()
+        headers = dict(scope['headers'])
+        declared = headers.get(b'content-length')
+        if (self.max_body_bytes is not None and declared is not None
+                and declared.isdigit() and int(declared) > self.max_body_bytes):
+            await self.send_simple(send, 413, b'Request Entity Too Large')
+            return
+
+        environ = self.build_environ(scope, None, 0)
+        release = None
+        if self.admission is not None:
+            rejection, release = self.admission(environ)
+            if rejection is not None:
+                # Shed on the headers alone: the client never gets to upload the body
+                environ['wsgi.input'] = io.BytesIO()
+                response = {}
+                body = b''.join(self.start_wsgi(environ, response, rejection))
+                await send({'type': 'http.response.start', 'status': response['status'],
+                            'headers': response['headers']})
+                await send({'type': 'http.response.body', 'body': body})
+                return
+        try:
+            await self.handle_admitted(environ, receive, send)
+        finally:
+            if release is not None:
+                release()
+
+    async def handle_admitted(self, environ, receive, send):
+        body, size = await self.read_body(receive)
+        if body is None:
+            if size:
+                await self.send_simple(send, 413, b'Request Entity Too Large')
+            return
+
+        # Every step of one request runs in the same context, so Flask's request
+        # context survives a streamed response hopping between pool threads
+        context = contextvars.copy_context()
+        try:
+            environ['wsgi.input'] = body
+            environ['CONTENT_LENGTH'] = str(size)
+            response = {}
+            iterable = await self.run(context, self.start_wsgi, environ, response)
+            await send({
+                'type': 'http.response.start',
+                'status': response['status'],
+                'headers': response['headers']
+            })
+            # Streamed responses (e.g. /classify/batch) produce each chunk on the pool
+            iterator = iter(iterable)
+            try:
+                while True:
+                    chunk = await self.run(context, next, iterator, None)
+                    if chunk is None:
+                        break
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            finally:
+                if hasattr(iterable, 'close'):
+                    await self.run(context, iterable.close)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            body.close()
+
+    async def handle_websocket(self, scope, receive, send):
+        self._ensure_started()
+        handler = self.websocket_routes.get(scope['path'])
+        if handler is None:
+            await receive()
+            # Closing before accepting makes the server answer the handshake with 403
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+        await handler(scope, receive, send, lambda fn, *args: self.run(contextvars.copy_context(), fn, *args))
+
+    async def run(self, context, fn, *args):
+        """Run fn(*args) on the pool; a slot is only held while the pool works, not while sending"""
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, fn, *args)
+
+    def start_wsgi(self, environ, response, wsgi_app=None):
+        """Call the WSGI app; returns its body iterable and fills ``response``"""
+        wsgi_app = wsgi_app or self.wsgi_app
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return written.append
+
+        iterable = wsgi_app(environ, start_response)
+        # Bodies passed to the legacy write() callable go out before the iterable
+        return written + list(iterable) if written else iterable
+
+    @staticmethod
+    def build_environ(scope, body, size):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'CONTENT_LENGTH': str(size),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+                continue
+            if name == 'CONTENT_LENGTH':
+                continue
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    @staticmethod
+    async def send_simple(send, status, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8'),
+                        (b'content-length', str(len(body)).encode('latin-1'))]
+        })
+        await send({'type': 'http.response.body', 'body': body})
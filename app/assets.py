@@ -0,0 +1,143 @@
+"""Fingerprinted, precompressed static assets.
+
+`build` copies every file under app/static (except uploads/) to
+Config.ASSETS_DIST_DIR under a content-hashed name, e.g.
+css/style.3f2a1b9c0d12.css, together with .gz and, if the optional `brotli`
+package is installed, .br versions. It also writes manifest.json mapping
+each original name to its hashed one. Templates link assets through
+asset_url(), so a changed file gets a new URL and every asset URL can be
+cached forever. Files of earlier builds are kept so pages still open
+during a rollout can load them.
+
+Usage (from the project root, as part of a deploy):
+    python -m app.assets
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_FILE = 'manifest.json'
+SKIP_DIRS = ('uploads', 'dist')
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.json', '.txt', '.html')
+# Content-Encoding token -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def hashed_name(path, data):
+    root, extension = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{extension}"
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_assets(static_dir='app/static', dist_dir=Config.ASSETS_DIST_DIR):
+    """Fingerprint and precompress everything in ``static_dir``; returns the manifest"""
+    manifest = {}
+    for directory, subdirectories, filenames in os.walk(static_dir):
+        if directory == static_dir:
+            subdirectories[:] = [d for d in subdirectories if d not in SKIP_DIRS]
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            if filename.startswith('.'):
+                continue
+            source = os.path.join(directory, filename)
+            logical = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            target = hashed_name(logical, data)
+            manifest[logical] = target
+            target_path = os.path.join(dist_dir, target)
+            if os.path.exists(target_path):
+                continue
+            _write(target_path, data)
+            if not filename.lower().endswith(COMPRESSIBLE):
+                continue
+            variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants['.br'] = brotli.compress(data, quality=11)
+            for suffix, compressed in variants.items():
+                # Only kept where it actually saves bytes
+                if len(compressed) < len(data):
+                    _write(target_path + suffix, compressed)
+
+    _write(os.path.join(dist_dir, MANIFEST_FILE), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    if brotli is None:
+        print("⚠️ brotli is not installed; only gzip versions were written (pip install brotli)")
+    print(f"✅ Built {len(manifest)} assets into {dist_dir}")
+    return manifest
+
+
+class AssetStore:
+    """Built assets served from memory
+
+    Without a manifest (no build yet) every lookup misses and templates fall
+    back to the regular /static URLs.
+    """
+
+    def __init__(self, dist_dir):
+        self.dist_dir = dist_dir
+        self.manifest = {}
+        try:
+            with open(os.path.join(dist_dir, MANIFEST_FILE)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            pass
+        self.served = set(self.manifest.values())
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def hashed_name(self, filename):
+        return self.manifest.get(filename)
+
+    def get(self, name, accept_encodings=()):
+        """(data, content encoding or None, mimetype) of a built asset, or None if unknown"""
+        if name not in self.served:
+            return None
+        versions = self._files.get(name)
+        if versions is None:
+            versions = self._load(name)
+        for encoding, _ in ENCODINGS:
+            if encoding in versions and encoding in accept_encodings:
+                return versions[encoding], encoding, versions['mimetype']
+        return versions[None], None, versions['mimetype']
+
+    def _load(self, name):
+        path = os.path.join(self.dist_dir, name)
+        versions = {'mimetype': mimetypes.guess_type(name)[0] or 'application/octet-stream'}
+        with open(path, 'rb') as f:
+            versions[None] = f.read()
+        for encoding, suffix in ENCODINGS:
+            if os.path.exists(path + suffix):
+                with open(path + suffix, 'rb') as f:
+                    versions[encoding] = f.read()
+        with self._lock:
+            self._files[name] = versions
+        return versions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress the static assets")
+    parser.add_argument('--static-dir', default='app/static')
+    parser.add_argument('--dist-dir', default=Config.ASSETS_DIST_DIR)
+    args = parser.parse_args(argv)
+    build_assets(args.static_dir, args.dist_dir)
+
+
+if __name__ == "__main__":
+    main()
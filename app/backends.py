@@ -0,0 +1,112 @@
+import os
+import threading
+import numpy as np
+
+
+class KerasBackend:
+    """Serves the original Keras .h5 model with TensorFlow"""
+
+    name = 'keras'
+
+    def __init__(self, model_path, num_threads=None):
+        import tensorflow as tf
+        if num_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        self.model = tf.keras.models.load_model(model_path)
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class TFLiteBackend:
+    """Serves a .tflite model (float32, float16 or full-integer quantized)"""
+
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        self.interpreter = self._interpreter_class()(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        # An interpreter is not thread-safe; calls are serialized
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _interpreter_class():
+        # Prefer the standalone runtime so serving does not need to import full TensorFlow
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+            return Interpreter
+        except ImportError:
+            pass
+        try:
+            from tflite_runtime.interpreter import Interpreter
+            return Interpreter
+        except ImportError:
+            import tensorflow as tf
+            return tf.lite.Interpreter
+
+    def _resize(self, batch_size):
+        if self.input['shape'][0] == batch_size:
+            return
+        self.interpreter.resize_tensor_input(self.input['index'], [batch_size, *self.input['shape'][1:]])
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+
+    def predict(self, batch):
+        with self._lock:
+            self._resize(len(batch))
+            input_dtype = self.input['dtype']
+            if input_dtype in (np.int8, np.uint8):
+                scale, zero_point = self.input['quantization']
+                batch = np.clip(np.round(batch / scale + zero_point),
+                                np.iinfo(input_dtype).min, np.iinfo(input_dtype).max)
+            self.interpreter.set_tensor(self.input['index'], batch.astype(input_dtype))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output['index'])
+            if self.output['dtype'] in (np.int8, np.uint8):
+                scale, zero_point = self.output['quantization']
+                output = (output.astype(np.float32) - zero_point) * scale
+            return output
+
+
+class OnnxBackend:
+    """Serves an ONNX export through ONNX Runtime"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self.input_name: batch.astype(np.float32)})[0]
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'tflite_fp16': TFLiteBackend,
+    'tflite_int8': TFLiteBackend,
+    'onnx': OnnxBackend
+}
+
+
+def model_version(model_path):
+    """Identify a model file by name, size and modification time"""
+    stat = os.stat(model_path)
+    return f"{os.path.basename(model_path)}-{stat.st_size}-{int(stat.st_mtime)}"
+
+
+def load_backend(variant, model_path, num_threads=None):
+    """Instantiate the runtime serving ``variant`` from ``model_path``"""
+    if variant not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{variant}', expected one of {sorted(BACKENDS)}")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(model_path)
+    return BACKENDS[variant](model_path, num_threads=num_threads)
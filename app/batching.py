@@ -0,0 +1,195 @@
+import threading
+import time
+import queue
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before its inference ran"""
+
+
+class _BatchItem:
+    __slots__ = ('array', 'future', 'enqueued_at', 'deadline')
+
+    def __init__(self, array, deadline=None):
+        self.array = array
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.deadline = deadline
+
+
+class BatchStats:
+    def __init__(self, window=1024):
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.expired = 0
+        self.batch_sizes = {}
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits = deque(maxlen=window)
+
+    def record(self, size, waits):
+        """Record one executed batch and the queue wait of each of its items"""
+        with self.lock:
+            self.batches += 1
+            self.items += size
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            for wait in waits:
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                self.recent_waits.append(wait)
+
+    def snapshot(self):
+        """Return the collected statistics as a plain dict"""
+        with self.lock:
+            waits = sorted(self.recent_waits)
+
+            def percentile(p):
+                if not waits:
+                    return 0.0
+                return waits[min(len(waits) - 1, int(p / 100.0 * len(waits)))] * 1000
+
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'errors': self.errors,
+                'expired': self.expired,
+                'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+                'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+                'queue_wait_ms': {
+                    'avg': round(self.total_wait / self.items * 1000, 3) if self.items else 0.0,
+                    'p50': round(percentile(50), 3),
+                    'p95': round(percentile(95), 3),
+                    'p99': round(percentile(99), 3),
+                    'max': round(self.max_wait * 1000, 3)
+                }
+            }
+
+
+class InferenceBatcher:
+    """Collects concurrent inference requests into a single batched forward pass"""
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.stats = BatchStats()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Started lazily (with self._lock held) so the worker thread is created after a Gunicorn fork
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, array, deadline=None):
+        """Queue a preprocessed array of shape (n, H, W, C) and return a Future of its predictions
+
+        ``deadline`` is a time.perf_counter() value; if it has passed by the time
+        the item is batched, the Future fails with DeadlineExceeded instead.
+        After close() the array is run right away on the caller's thread.
+        """
+        item = _BatchItem(array, deadline)
+        with self._lock:
+            if not self._closed:
+                self._ensure_started()
+                self._queue.put(item)
+                return item.future
+        self._execute([item])
+        return item.future
+
+    def close(self):
+        """Stop the worker thread once the items already queued have run"""
+        with self._lock:
+            self._closed = True
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put(None)
+
+    def pending(self):
+        """Number of items waiting to be batched"""
+        return self._queue.qsize()
+
+    def predict(self, array, timeout=None, deadline=None):
+        """Blocking helper around submit()"""
+        return self.submit(array, deadline=deadline).result(timeout=timeout)
+
+    def _collect(self):
+        """Next batch of items and whether close() was requested (a None in the queue)"""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        items = [first]
+        rows = len(first.array)
+        deadline = first.enqueued_at + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return items, True
+            items.append(item)
+            rows += len(item.array)
+
+        return items, False
+
+    def _drop_expired(self, items, now):
+        """Fail items whose deadline has passed so the model never sees them"""
+        live = []
+        for item in items:
+            if item.deadline is not None and item.deadline <= now:
+                item.future.set_exception(DeadlineExceeded("Deadline exceeded while waiting for inference"))
+            else:
+                live.append(item)
+        if len(live) != len(items):
+            with self.stats.lock:
+                self.stats.expired += len(items) - len(live)
+        return live
+
+    def _run(self):
+        while True:
+            items, closing = self._collect()
+            if items:
+                self._execute(items)
+            if closing:
+                return
+
+    def _execute(self, items):
+        started = time.perf_counter()
+        items = self._drop_expired(items, started)
+        if not items:
+            return
+        waits = [started - item.enqueued_at for item in items]
+
+        try:
+            if len(items) == 1:
+                batch = items[0].array
+            else:
+                batch = np.concatenate([item.array for item in items], axis=0)
+            predictions = np.asarray(self.predict_fn(batch))
+        except Exception as e:
+            with self.stats.lock:
+                self.stats.errors += 1
+            for item in items:
+                item.future.set_exception(e)
+            return
+
+        offset = 0
+        for item in items:
+            count = len(item.array)
+            item.future.set_result(predictions[offset:offset + count])
+            offset += count
+
+        self.stats.record(len(batch), waits)
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCacheBackend:
+    """Per-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries=10000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteCacheBackend:
+    """On-disk LRU cache shared by every worker process on the host"""
+
+    TRIM_EVERY = 64
+
+    def __init__(self, path, max_entries=10000, ttl=3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS predictions ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS predictions_accessed ON predictions (accessed_at)')
+
+    def _connect(self):
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            'SELECT value FROM predictions WHERE key = ? AND expires_at >= ?', (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute('UPDATE predictions SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO predictions (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value), now + self.ttl, now)
+        )
+        # set() runs on request threads and the batcher; exactly one of them trims per TRIM_EVERY writes
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % self.TRIM_EVERY == 0
+        if due:
+            self.trim()
+
+    def trim(self):
+        """Drop expired entries and evict least recently used ones above max_entries"""
+        conn = self._connect()
+        conn.execute('DELETE FROM predictions WHERE expires_at < ?', (time.time(),))
+        conn.execute(
+            'DELETE FROM predictions WHERE key IN ('
+            'SELECT key FROM predictions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+
+
+class PredictionCache:
+    """Content-addressed cache of predictions keyed by image bytes and model version"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(img_bytes, model_version):
+        digest = hashlib.sha256(img_bytes).hexdigest()
+        return f"{model_version}:{digest}"
+
+    def get(self, key):
+        """Return the cached prediction dict for ``key`` or None"""
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"⚠️ Prediction cache read failed: {e}")
+            value = None
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            print(f"⚠️ Prediction cache write failed: {e}")
+            with self._lock:
+                self.errors += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+        try:
+            stats['entries'] = len(self.backend)
+        except Exception:
+            pass
+        return stats
+
+
+def create_prediction_cache(config):
+    """Build the prediction cache selected by PREDICTION_CACHE_BACKEND, or None if disabled"""
+    backend_name = (config.PREDICTION_CACHE_BACKEND or 'none').lower()
+    if backend_name == 'memory':
+        backend = MemoryCacheBackend(config.PREDICTION_CACHE_MAX_ENTRIES, config.PREDICTION_CACHE_TTL)
+    elif backend_name == 'sqlite':
+        backend = SqliteCacheBackend(
+            config.PREDICTION_CACHE_PATH,
+            config.PREDICTION_CACHE_MAX_ENTRIES,
+            config.PREDICTION_CACHE_TTL
+        )
+    elif backend_name == 'none':
+        return None
+    else:
+        raise ValueError(f"Unknown PREDICTION_CACHE_BACKEND: {config.PREDICTION_CACHE_BACKEND}")
+    return PredictionCache(backend)
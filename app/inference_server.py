@@ -0,0 +1,276 @@
+"""Standalone inference process shared by all web workers.
+
+One process owns the model and serves preprocessed batches over a Unix socket,
+so Gunicorn workers don't each load their own copy of the runtime and weights.
+
+The server serves the model store's active version (MODEL_PATH without a
+manifest) and polls the manifest like the web workers do, hot-swapping to a
+newly activated version. Canary and shadow candidates are not supported here:
+only the active version is served, and a configured candidate is reported
+as ignored.
+
+Usage (from the project root):
+    python -m app.inference_server --socket /tmp/greencity-inference.sock
+    INFERENCE_SERVER_SOCKET=/tmp/greencity-inference.sock gunicorn -w 8 --threads 4 run:app
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+from config import Config
+from app.backends import load_backend, model_version
+from app.batching import DeadlineExceeded, InferenceBatcher
+from app.model_store import ModelStore
+
+# Frame: 4-byte big-endian header length, JSON header, then header['nbytes'] of raw array data
+_LENGTH = struct.Struct('>I')
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Connection closed by peer")
+        received += count
+    return buffer
+
+
+def send_frame(sock, header, array=None):
+    payload = b''
+    if array is not None:
+        array = np.ascontiguousarray(array)
+        header = dict(header, shape=list(array.shape), dtype=str(array.dtype), nbytes=array.nbytes)
+        payload = memoryview(array).cast('B')
+    encoded = json.dumps(header).encode('utf-8')
+    sock.sendall(_LENGTH.pack(len(encoded)) + encoded)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_frame(sock):
+    (length,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    header = json.loads(bytes(_recv_exact(sock, length)))
+    array = None
+    if header.get('nbytes'):
+        data = _recv_exact(sock, header['nbytes'])
+        array = np.frombuffer(data, dtype=header['dtype']).reshape(header['shape'])
+    return header, array
+
+
+class RemoteBackend:
+    """Client side of the inference server with the same predict(batch) interface as local backends"""
+
+    name = 'remote'
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self.info = self._request({'op': 'info'})[0]
+
+    def _connection(self):
+        # One persistent connection per thread and per process
+        sock = getattr(self._local, 'sock', None)
+        if sock is None or self._local.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+            self._local.pid = os.getpid()
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def _request(self, header, array=None, timeout=None):
+        # Retry once on a fresh connection in case the server was restarted, but only
+        # while the request hasn't been fully sent: a slow predict that already reached
+        # the server is never sent twice, and timeouts propagate
+        for attempt in range(2):
+            sent = False
+            try:
+                sock = self._connection()
+                sock.settimeout(self.timeout if timeout is None else timeout)
+                send_frame(sock, header, array)
+                sent = True
+                response, result = recv_frame(sock)
+                break
+            except (ConnectionError, FileNotFoundError):
+                self._reset()
+                if attempt or sent:
+                    raise
+            except BaseException:
+                # A late response would otherwise be read as the answer to the next request
+                self._reset()
+                raise
+        if 'error' in response:
+            raise RuntimeError(f"Inference server error: {response['error']}")
+        return response, result
+
+    def refresh_info(self):
+        """Ask the server again which model it serves"""
+        self.info = self._request({'op': 'info'})[0]
+        return self.info
+
+    def predict(self, batch, deadline=None):
+        return self.predict_versioned(batch, deadline=deadline)[0]
+
+    def predict_versioned(self, batch, deadline=None):
+        """(probabilities, version of the model the server answered with)
+
+        With a time.perf_counter() ``deadline`` the request is not sent once it
+        has passed, and waits for the answer only until it passes; both raise
+        DeadlineExceeded.
+        """
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.perf_counter())
+            if timeout <= 0:
+                raise DeadlineExceeded("Deadline exceeded before inference")
+        try:
+            response, result = self._request({'op': 'predict'}, np.asarray(batch, dtype=np.float32), timeout=timeout)
+        except socket.timeout:
+            if deadline is not None and time.perf_counter() >= deadline:
+                raise DeadlineExceeded("Deadline exceeded waiting for the inference server")
+            raise
+        return result, response.get('model_version')
+
+
+class _InferenceHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                header, array = recv_frame(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                if header.get('op') == 'info':
+                    send_frame(self.request, server.info)
+                elif header.get('op') == 'predict':
+                    served = server.served
+                    send_frame(self.request, {'model_version': served.version}, served.batcher.predict(array))
+                else:
+                    send_frame(self.request, {'error': f"Unknown op: {header.get('op')}"})
+            except ConnectionError:
+                # The client gave up (e.g. timed out) before its answer was sent
+                return
+            except Exception as e:
+                send_frame(self.request, {'error': str(e)})
+
+
+class _ServedModel:
+    __slots__ = ('version', 'backend', 'batcher')
+
+    def __init__(self, version, backend, batcher):
+        self.version = version
+        self.backend = backend
+        self.batcher = batcher
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, variant, model_path, max_batch_size, max_wait_ms, num_threads=None,
+                 version=None, store=None):
+        self.variant = variant
+        self.num_threads = num_threads
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.store = store
+        self._manifest_signature = store.signature() if store is not None else None
+        self.served = self.load(version or model_version(model_path), model_path)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _InferenceHandler)
+
+    @property
+    def info(self):
+        return {'backend': self.variant, 'model_version': self.served.version}
+
+    def load(self, version, model_path):
+        backend = load_backend(self.variant, model_path, num_threads=self.num_threads)
+        # Requests from every web worker are merged into shared batches
+        batcher = InferenceBatcher(backend.predict, self.max_batch_size, self.max_wait_ms)
+        batcher.predict(np.zeros((1, *Config.IMAGE_SIZE, 3), dtype=np.float32))
+        return _ServedModel(version, backend, batcher)
+
+    def watch_store(self, interval):
+        """Poll the manifest and swap in a newly activated version (runs on its own thread)"""
+        failures = 0
+        while True:
+            time.sleep(interval if not failures else min(300, max(1, interval) * 2 ** (failures - 1)))
+            signature = self.store.signature()
+            if signature is None or signature == self._manifest_signature:
+                continue
+            try:
+                self.reload()
+            except Exception as e:
+                failures += 1
+                print(f"⚠️ Could not load the active model version, still serving {self.served.version}: {e}")
+                continue
+            failures = 0
+            self._manifest_signature = signature
+
+    def reload(self):
+        warn_unsupported_candidate(self.store)
+        active = self.store.active_model(self.variant)
+        if active is None or active[1] == self.served.version:
+            return
+        model_path, version = active
+        previous = self.served
+        self.served = self.load(version, model_path)
+        # Requests already queued on the previous batcher still complete
+        previous.batcher.close()
+        print(f"✅ Inference server now serving model version {self.served.version}")
+
+
+def warn_unsupported_candidate(store):
+    candidate = (store.manifest() or {}).get('candidate') or {}
+    if candidate.get('version'):
+        print(f"⚠️ Candidate {candidate['version']} ignored: the inference server only serves "
+              f"the active version, canary and shadow need workers that load the model themselves")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the waste classifier to local web workers")
+    parser.add_argument('--socket', default=Config.INFERENCE_SERVER_SOCKET or '/tmp/greencity-inference.sock')
+    parser.add_argument('--backend', default=Config.INFERENCE_BACKEND)
+    parser.add_argument('--max-batch-size', type=int, default=Config.BATCH_MAX_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=Config.BATCH_MAX_WAIT_MS)
+    args = parser.parse_args(argv)
+
+    store = ModelStore(Config.MODEL_STORE_DIR)
+    model_path, version = Config.MODEL_VARIANTS.get(args.backend, Config.MODEL_PATH), None
+    active = store.active_model(args.backend)
+    if active is not None:
+        model_path, version = active
+    server = InferenceServer(args.socket, args.backend, model_path, args.max_batch_size, args.max_wait_ms,
+                             Config.INFERENCE_THREADS, version=version, store=store)
+    warn_unsupported_candidate(store)
+    if Config.MODEL_RELOAD_INTERVAL > 0:
+        threading.Thread(target=server.watch_store, args=(Config.MODEL_RELOAD_INTERVAL,),
+                         name='model-watcher', daemon=True).start()
+    print(f"✅ Inference server ({args.backend}, model {server.served.version}) listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+# Latency buckets in seconds, from sub-millisecond decode steps up to slow uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f'{self.name}{_format_labels(key)} {value}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{self.name}_bucket{_format_labels(key + (("le", le),))} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(key)} {total}')
+        lines.append(f'{self.name}_count{_format_labels(key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """Register a callable run before every render, e.g. to copy stats into gauges"""
+        self.collectors.append(collector)
+
+    def render(self):
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    'greencity_request_duration_seconds', 'HTTP request latency', ('endpoint', 'method', 'status')))
+STAGE_DURATION = registry.register(Histogram(
+    'greencity_stage_duration_seconds', 'Time spent per /classify pipeline stage', ('stage',)))
+PREDICTIONS = registry.register(Counter(
+    'greencity_predictions_total', 'Predictions served', ('category', 'source', 'version')))
+CACHE_LOOKUPS = registry.register(Counter(
+    'greencity_prediction_cache_lookups_total', 'Prediction cache lookups', ('result',)))
+MODEL_INFO = registry.register(Gauge(
+    'greencity_model_info', 'Loaded model versions and their backend', ('version', 'backend', 'state', 'role')))
+SHADOW_PREDICTIONS = registry.register(Counter(
+    'greencity_shadow_predictions_total', 'Shadow model top-1 compared with the active model', ('result',)))
+MODEL_LOAD_SECONDS = registry.register(Gauge(
+    'greencity_model_load_seconds', 'Duration of the last model load and warmup', ('phase',)))
+BATCHER = registry.register(Gauge(
+    'greencity_batcher', 'Inference batcher statistics', ('stat',)))
+ADMISSION = registry.register(Counter(
+    'greencity_admission_total', 'Admission decisions for classification requests', ('outcome',)))
+ADMISSION_PENDING = registry.register(Gauge(
+    'greencity_admission_pending', 'Classification requests currently held by this worker'))
+ADMISSION_LIMITS = registry.register(Gauge(
+    'greencity_admission_limit', 'Configured admission control limits', ('limit',)))
+STREAM_FRAMES = registry.register(Counter(
+    'greencity_stream_frames_total', 'Camera stream frames by what happened to them', ('outcome',)))
+STREAM_CONNECTIONS = registry.register(Gauge(
+    'greencity_stream_connections', 'Open camera stream WebSockets'))
+
+
+@contextmanager
+def timed_stage(name):
+    """Time a pipeline stage into the stage histogram and the request's Server-Timing header"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, stage=name)
+        if has_request_context():
+            timings = g.setdefault('server_timing', [])
+            timings.append((name, elapsed))
+
+
+def server_timing_header(timings):
+    """Format [(stage, seconds)] as a Server-Timing header value, summing repeated stages"""
+    totals = {}
+    for name, elapsed in timings:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ', '.join(f'{name};dur={elapsed * 1000:.2f}' for name, elapsed in totals.items())
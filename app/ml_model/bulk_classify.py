@@ -0,0 +1,289 @@
+"""Offline bulk classification of large image archives.
+
+Walks a directory tree lazily, decodes images in a process pool and runs the
+model on large batches, streaming one CSV row or JSON line per image with the
+top-k probabilities. Progress is checkpointed next to the output after every
+batch, so an interrupted run continues with ``--resume``. Memory use stays
+flat however many images there are: paths are generated on the fly and only
+a bounded number of decoded chunks are in flight.
+
+Usage (from the project root):
+    python -m app.ml_model.bulk_classify /data/truck-photos --output results.csv
+    python -m app.ml_model.bulk_classify /data/truck-photos --output results.jsonl --top-k 3 --resume
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import Config
+from app.backends import load_backend, model_version
+from app.model_store import ModelStore
+from app.ml_model.preprocess import ImagePreprocessor, preprocess_input
+
+IMAGE_EXTENSIONS = tuple(f'.{extension}' for extension in sorted(Config.ALLOWED_EXTENSIONS))
+
+
+def iter_images(root):
+    """Yield image paths under ``root`` in a stable (sorted, depth-first) order
+
+    Only one directory listing is held at a time, so the order can be
+    replayed on resume without keeping the full list of paths.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as scan:
+                entries = sorted(scan, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"⚠️ Skipping {directory}: {e}")
+            continue
+        subdirectories = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield entry.path
+        stack.extend(reversed(subdirectories))
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+_preprocessor = None
+
+
+def _init_worker(image_size, fast_decode):
+    global _preprocessor
+    _preprocessor = ImagePreprocessor(target_size=image_size, fast_decode=fast_decode)
+
+
+def _decode_chunk(paths):
+    """Decode ``paths`` in a worker process into (uint8 array of the readable ones, {index: error})"""
+    images = np.empty((len(paths), *_preprocessor.target_size, 3), dtype=np.uint8)
+    errors = {}
+    for index, path in enumerate(paths):
+        try:
+            images[index] = _preprocessor.decode(path)
+        except Exception as e:
+            errors[index] = str(e) or type(e).__name__
+    if errors:
+        images = images[[i for i in range(len(paths)) if i not in errors]]
+    return images, errors
+
+
+def decoded_chunks(paths, workers, chunk_size, image_size, fast_decode=True):
+    """Yield (paths, images, errors) per chunk, in input order
+
+    At most ``2 * workers`` chunks are queued, so neither the path generator
+    nor the decoded images run ahead of inference.
+    """
+    # Spawned workers don't inherit the model runtime's threads and locks
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(image_size, fast_decode)) as pool:
+        pending = deque()
+        for chunk in chunked(paths, chunk_size):
+            pending.append((chunk, pool.submit(_decode_chunk, chunk)))
+            if len(pending) >= 2 * workers:
+                chunk, future = pending.popleft()
+                yield (chunk, *future.result())
+        while pending:
+            chunk, future = pending.popleft()
+            yield (chunk, *future.result())
+
+
+class ResultWriter:
+    """Appends results as CSV rows or JSON lines and records how far the file is complete"""
+
+    def __init__(self, path, top_k, resume_offset=None):
+        self.path = path
+        self.top_k = top_k
+        self.jsonl = path.endswith(('.jsonl', '.ndjson'))
+        if resume_offset is not None:
+            # Drop rows written after the last checkpoint; they are classified again
+            with open(path, 'r+b') as f:
+                f.truncate(resume_offset)
+            self.file = open(path, 'a', newline='', encoding='utf-8')
+        else:
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.csv = None if self.jsonl else csv.writer(self.file)
+        if self.csv is not None and resume_offset is None:
+            header = ['path', 'category', 'confidence', 'model_version']
+            for rank in range(1, top_k + 1):
+                header += [f'top{rank}_category', f'top{rank}_probability']
+            self.csv.writerow(header + ['error'])
+
+    def write(self, path, version, top=None, error=None):
+        """``top`` is [(category, probability)] best first, None for unreadable images"""
+        top = top or []
+        if self.jsonl:
+            record = {'path': path, 'model_version': version}
+            if error is None:
+                record.update(category=top[0][0], confidence=round(top[0][1], 6),
+                              top_k=[{'category': c, 'probability': round(p, 6)} for c, p in top])
+            else:
+                record['error'] = error
+            self.file.write(json.dumps(record) + '\n')
+            return
+        row = [path, top[0][0] if top else '', f'{top[0][1]:.6f}' if top else '', version]
+        for rank in range(self.top_k):
+            row += [top[rank][0], f'{top[rank][1]:.6f}'] if rank < len(top) else ['', '']
+        self.csv.writerow(row + [error or ''])
+
+    def commit(self):
+        """Make everything written so far durable and return the file offset it ends at"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def write_progress(path, progress):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, path)
+
+
+def resolve_model(backend, model_path=None):
+    """(path, version) of the model to run: explicit path, the model store's active version, or MODEL_PATH"""
+    if model_path:
+        return model_path, model_version(model_path)
+    active = ModelStore(Config.MODEL_STORE_DIR).active_model(backend)
+    if active is not None:
+        return active
+    path = Config.MODEL_VARIANTS.get(backend, Config.MODEL_PATH)
+    return path, model_version(path)
+
+
+def top_k_predictions(probabilities, k):
+    """[(category, probability)] of the ``k`` most likely classes per row, best first"""
+    k = min(k, probabilities.shape[1])
+    order = np.argsort(-probabilities, axis=1)[:, :k]
+    return [[(Config.WASTE_CATEGORIES[int(c)], float(row[c])) for c in classes]
+            for row, classes in zip(probabilities, order)]
+
+
+def classify_tree(root, output, backend='keras', model_path=None, batch_size=256, top_k=3,
+                  workers=None, decode_chunk=32, resume=False, num_threads=None):
+    """Classify every image under ``root`` into ``output``; returns the number of images written"""
+    model_path, version = resolve_model(backend, model_path)
+    progress_path = f'{output}.progress.json'
+    run = {'root': os.path.abspath(root), 'model_version': version, 'top_k': top_k,
+           'image_size': list(Config.IMAGE_SIZE)}
+
+    done, offset = 0, None
+    if resume and os.path.exists(progress_path) and os.path.exists(output):
+        with open(progress_path) as f:
+            progress = json.load(f)
+        if progress['run'] != run:
+            raise SystemExit(f"{progress_path} belongs to a different run ({progress['run']}); "
+                             f"remove it or run without --resume")
+        done, offset = progress['done'], progress['offset']
+        if os.path.getsize(output) < offset:
+            raise SystemExit(f"{output} is shorter than its checkpoint; run without --resume")
+        print(f"Resuming after {done} images ({progress['last_path']})")
+    elif os.path.exists(progress_path):
+        # A fresh run rewrites the output, so the old checkpoint no longer matches it
+        os.remove(progress_path)
+
+    paths = iter_images(root)
+    if done:
+        # Replaying the walk is cheap: skipped paths are never decoded
+        last = None
+        for last in itertools.islice(paths, done):
+            pass
+        if last != progress['last_path']:
+            print(f"⚠️ Input tree changed since the checkpoint (expected {progress['last_path']}, found {last})")
+
+    model = load_backend(backend, model_path, num_threads=num_threads)
+    print(f"✅ Model {version} loaded ({backend})")
+    writer = ResultWriter(output, top_k, resume_offset=offset)
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    started = time.perf_counter()
+    reported = started
+    processed = 0
+    pending_paths, pending_images, pending_errors = [], [], {}
+
+    def flush():
+        nonlocal done, processed
+        rows = iter(top_k_predictions(model.predict(preprocess_input(
+            np.concatenate(pending_images).astype(np.float32))), top_k)) if pending_images else iter(())
+        for index, path in enumerate(pending_paths):
+            if index in pending_errors:
+                writer.write(path, version, error=pending_errors[index])
+            else:
+                writer.write(path, version, top=next(rows))
+        done += len(pending_paths)
+        processed += len(pending_paths)
+        write_progress(progress_path, {'run': run, 'done': done, 'offset': writer.commit(),
+                                          'last_path': pending_paths[-1]})
+        pending_paths.clear()
+        pending_images.clear()
+        pending_errors.clear()
+
+    try:
+        for chunk, images, errors in decoded_chunks(paths, workers, decode_chunk, Config.IMAGE_SIZE,
+                                                    Config.FAST_JPEG_DECODE):
+            base = len(pending_paths)
+            pending_paths.extend(chunk)
+            pending_errors.update({base + index: message for index, message in errors.items()})
+            if len(images):
+                pending_images.append(images)
+            if len(pending_paths) >= batch_size:
+                flush()
+                now = time.perf_counter()
+                if now - reported >= 10:
+                    reported = now
+                    print(f"  {done} images ({processed / (now - started):.1f} images/sec)")
+        if pending_paths:
+            flush()
+    except KeyboardInterrupt:
+        print(f"\n⏸️ Interrupted after {done} images; continue with --resume")
+        raise SystemExit(130)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Classified {processed} images in {elapsed:.1f}s "
+          f"({processed / max(elapsed, 1e-9):.1f} images/sec), {done} in {output}")
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify every image under a directory tree")
+    parser.add_argument('root', help="Directory to walk")
+    parser.add_argument('--output', required=True, help="Results file; .jsonl/.ndjson for JSON lines, CSV otherwise")
+    parser.add_argument('--backend', default=Config.INFERENCE_BACKEND, choices=sorted(Config.MODEL_VARIANTS))
+    parser.add_argument('--model', help="Model file (default: the active published version, else MODEL_PATH)")
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--workers', type=int, help="Decode processes (default: cores - 1)")
+    parser.add_argument('--decode-chunk', type=int, default=32, help="Images per decode task")
+    parser.add_argument('--threads', type=int, default=Config.INFERENCE_THREADS, help="Inference threads")
+    parser.add_argument('--resume', action='store_true', help="Continue from the output's checkpoint")
+    args = parser.parse_args(argv)
+    classify_tree(args.root, args.output, backend=args.backend, model_path=args.model,
+                  batch_size=args.batch_size, top_k=args.top_k, workers=args.workers,
+                  decode_chunk=args.decode_chunk, resume=args.resume, num_threads=args.threads)
+
+
+if __name__ == "__main__":
+    main()
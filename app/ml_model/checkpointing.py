@@ -0,0 +1,203 @@
+"""Resumable training: checkpoints with optimizer state and data position.
+
+A run is split into phases ('head', then 'finetune'). Each phase keeps its
+TensorFlow checkpoints (model + optimizer) under ``<checkpoint_dir>/<phase>/``
+and the best weights by val_loss in ``best-<phase>.weights.h5``.
+``state.json`` records where the run is: phase, epoch, step within the epoch,
+the latest checkpoint and the early stopping / LR schedule counters.
+A fresh run deletes only these files and refuses a directory holding anything else.
+"""
+import json
+import os
+import shutil
+import tensorflow as tf
+
+STATE_FILE = 'state.json'
+PHASES = ('head', 'finetune')
+# Counters of EarlyStopping / ReduceLROnPlateau that have to survive a restart
+CALLBACK_STATE = ('wait', 'best', 'best_epoch', 'cooldown_counter')
+
+
+def atomic_write_json(path, data):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _is_checkpoint_file(name):
+    # Written by this module: the state file, best weights and their temporary copies
+    return (name == STATE_FILE or name.startswith(f'{STATE_FILE}.tmp-')
+            or (name.startswith('best-') and name.endswith('.weights.h5')))
+
+
+def _is_phase_dir(path):
+    # A phase's tf.train.CheckpointManager directory: 'checkpoint' plus ckpt-N.* files
+    return (os.path.basename(path) in PHASES and os.path.isdir(path)
+            and all(name == 'checkpoint' or name.startswith('ckpt-') for name in os.listdir(path)))
+
+
+def clear_checkpoints(checkpoint_dir):
+    """Delete the checkpoints of a previous run in ``checkpoint_dir``
+
+    Only files this module writes are removed. If the directory holds anything
+    else it is probably not a checkpoint directory, and nothing is deleted.
+    """
+    entries = [os.path.join(checkpoint_dir, name) for name in os.listdir(checkpoint_dir)]
+    foreign = [path for path in entries
+               if not (_is_phase_dir(path) or (os.path.isfile(path) and _is_checkpoint_file(os.path.basename(path))))]
+    if foreign:
+        raise ValueError(f"{checkpoint_dir} contains files that are not training checkpoints "
+                         f"({', '.join(sorted(os.path.basename(path) for path in foreign)[:5])}); "
+                         f"choose an empty or dedicated --checkpoint-dir")
+    for path in entries:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+class TrainingState:
+    """Progress of a resumable run, stored next to its checkpoints"""
+
+    def __init__(self, checkpoint_dir, run=None, resume=True):
+        self.checkpoint_dir = checkpoint_dir
+        self.path = os.path.join(checkpoint_dir, STATE_FILE)
+        saved = None
+        if resume and os.path.exists(self.path):
+            with open(self.path) as f:
+                saved = json.load(f)
+            if run is not None and saved.get('run') != run:
+                raise ValueError(f"Checkpoints in {checkpoint_dir} belong to a different run "
+                                 f"({saved.get('run')} vs {run}); remove them or train without --resume")
+        elif os.path.isdir(checkpoint_dir):
+            # A fresh run must not pick up another run's checkpoints
+            clear_checkpoints(checkpoint_dir)
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        saved = saved or {}
+        self.run = run
+        self.phase = saved.get('phase')
+        self.epoch = saved.get('epoch', 0)
+        self.step = saved.get('step', 0)
+        self.checkpoint = saved.get('checkpoint')
+        self.best_val_loss = saved.get('best_val_loss')
+        self.callbacks = saved.get('callbacks', {})
+        self.completed = saved.get('completed', [])
+        if self.phase is not None:
+            print(f"Resuming phase '{self.phase}' at epoch {self.epoch + 1}, step {self.step}")
+
+    def position(self, phase):
+        """(epoch, step) to continue ``phase`` from"""
+        if phase in self.completed:
+            return None
+        if self.phase != phase:
+            return 0, 0
+        return self.epoch, self.step
+
+    def best_weights_path(self, phase):
+        return os.path.join(self.checkpoint_dir, f'best-{phase}.weights.h5')
+
+    def start_phase(self, phase):
+        if self.phase != phase:
+            self.phase, self.epoch, self.step = phase, 0, 0
+            self.checkpoint, self.best_val_loss, self.callbacks = None, None, {}
+            self.save()
+
+    def finish_phase(self, phase):
+        self.completed.append(phase)
+        self.phase, self.checkpoint = None, None
+        self.save()
+
+    def save(self):
+        atomic_write_json(self.path, {
+            'run': self.run,
+            'phase': self.phase,
+            'epoch': self.epoch,
+            'step': self.step,
+            'checkpoint': self.checkpoint,
+            'best_val_loss': self.best_val_loss,
+            'callbacks': self.callbacks,
+            'completed': self.completed
+        })
+
+
+class ResumableCheckpoint(tf.keras.callbacks.Callback):
+    """Checkpoints model, optimizer and data position every ``every_steps`` steps and every epoch
+
+    Also keeps the best weights by val_loss and the counters of ``tracked``
+    callbacks (EarlyStopping, ReduceLROnPlateau). Put it after those callbacks
+    so it saves their state after they have seen the epoch's val_loss.
+    """
+
+    def __init__(self, state, phase, steps_per_epoch, every_steps=0, tracked=(), max_to_keep=2):
+        super().__init__()
+        self.state = state
+        self.phase = phase
+        self.steps_per_epoch = steps_per_epoch
+        self.every_steps = every_steps
+        self.tracked = {type(callback).__name__: callback for callback in tracked}
+        self.max_to_keep = max_to_keep
+        self.manager = None
+        self.global_step = 0
+
+    def restore(self, model):
+        """Create the checkpoint for ``model`` (compiled) and restore this phase's latest one"""
+        # Optimizer slots are created lazily; build them so they can be restored
+        model.optimizer.build(model.trainable_variables)
+        checkpoint = tf.train.Checkpoint(model=model, optimizer=model.optimizer)
+        self.manager = tf.train.CheckpointManager(
+            checkpoint, os.path.join(self.state.checkpoint_dir, self.phase), max_to_keep=self.max_to_keep)
+        epoch, step = self.state.position(self.phase)
+        if self.state.phase == self.phase and self.state.checkpoint:
+            checkpoint.restore(self.state.checkpoint).assert_existing_objects_matched()
+            print(f"Restored {self.state.checkpoint}")
+        self.global_step = epoch * self.steps_per_epoch + step
+
+    def on_train_begin(self, logs=None):
+        # Runs after the tracked callbacks have reset themselves
+        for name, saved in self.state.callbacks.items():
+            callback = self.tracked.get(name)
+            for attr, value in (saved.items() if callback is not None else ()):
+                if value is not None:
+                    setattr(callback, attr, value)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.global_step += 1
+        if self.every_steps and self.global_step % self.every_steps == 0 \
+                and self.global_step % self.steps_per_epoch:
+            self.save()
+
+    def on_epoch_end(self, epoch, logs=None):
+        val_loss = (logs or {}).get('val_loss')
+        if val_loss is not None and (self.state.best_val_loss is None or val_loss < self.state.best_val_loss):
+            self.state.best_val_loss = float(val_loss)
+            path = self.state.best_weights_path(self.phase)
+            tmp_path = path.replace('.weights.h5', f'.tmp-{os.getpid()}.weights.h5')
+            self.model.save_weights(tmp_path)
+            os.replace(tmp_path, path)
+        self.save()
+
+    def save(self):
+        self.state.epoch, self.state.step = divmod(self.global_step, self.steps_per_epoch)
+        self.state.checkpoint = self.manager.save(checkpoint_number=self.global_step)
+        self.state.callbacks = {
+            name: {attr: _plain(getattr(callback, attr)) for attr in CALLBACK_STATE if hasattr(callback, attr)}
+            for name, callback in self.tracked.items()
+        }
+        self.state.save()
+
+
+def load_best_weights(model, state, phase):
+    """Load the best weights seen in ``phase`` into ``model``, if there are any"""
+    path = state.best_weights_path(phase)
+    if os.path.exists(path):
+        model.load_weights(path)
+        print(f"Loaded best '{phase}' weights")
+
+
+def _plain(value):
+    """JSON-serializable copy of a callback counter"""
+    try:
+        return float(value) if not isinstance(value, int) else value
+    except (TypeError, ValueError):
+        return None
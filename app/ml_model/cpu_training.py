@@ -0,0 +1,136 @@
+"""CPU training profile: XLA, bfloat16 mixed precision, thread and oneDNN settings.
+
+TensorFlow reads the oneDNN switch when it is imported, so configure_environment()
+has to run before the first ``import tensorflow``; the rest is applied by
+CpuTrainingProfile.apply() before the model is built.
+"""
+import os
+import sys
+import time
+
+
+def cpu_supports_bf16():
+    """True if the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+
+def add_profile_arguments(parser):
+    group = parser.add_argument_group('CPU training profile')
+    group.add_argument('--cpu-profile', action='store_true',
+                       help="Enable XLA, bfloat16 (if supported) and tuned thread settings")
+    group.add_argument('--jit', choices=('on', 'off'), help="XLA compilation (default: on with --cpu-profile)")
+    group.add_argument('--bf16', choices=('auto', 'on', 'off'),
+                       help="mixed_bfloat16 precision (default: auto with --cpu-profile, i.e. only on CPUs with bf16 support)")
+    group.add_argument('--intra-op-threads', type=int, help="Threads used inside one op")
+    group.add_argument('--inter-op-threads', type=int, help="Ops run in parallel")
+    group.add_argument('--data-threads', type=int, help="Threads of the tf.data input pipeline")
+    group.add_argument('--onednn', choices=('on', 'off'), help="oneDNN kernels (default: TensorFlow's choice)")
+    return parser
+
+
+def configure_environment(argv=None):
+    """Apply the environment-only settings (oneDNN) from ``argv`` before TensorFlow is imported"""
+    import argparse
+    args, _ = add_profile_arguments(argparse.ArgumentParser(add_help=False)).parse_known_args(argv)
+    if args.onednn is None:
+        return
+    if 'tensorflow' in sys.modules:
+        print("⚠️ TensorFlow is already imported; --onednn has no effect")
+    os.environ['TF_ENABLE_ONEDNN_OPTS'] = '1' if args.onednn == 'on' else '0'
+
+
+class CpuTrainingProfile:
+    """Runtime settings for training on CPU-only machines
+
+    Without an explicit thread count the cores are split between the model
+    (intra-op) and the input pipeline (data threads) instead of both sizing
+    themselves to every core.
+    """
+
+    def __init__(self, jit_compile=False, bf16='off', intra_op_threads=None, inter_op_threads=None,
+                 data_threads=None, tune_threads=False):
+        self.jit_compile = jit_compile
+        self.mixed_bfloat16 = bf16 == 'on' or (bf16 == 'auto' and cpu_supports_bf16())
+        self.data_threads = data_threads
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        if tune_threads:
+            cores = os.cpu_count() or 1
+            self.data_threads = data_threads or max(1, cores // 4)
+            self.intra_op_threads = intra_op_threads or max(1, cores - self.data_threads)
+            self.inter_op_threads = inter_op_threads or 2
+
+    @classmethod
+    def from_args(cls, args):
+        tuned = args.cpu_profile
+        return cls(
+            jit_compile=(args.jit or ('on' if tuned else 'off')) == 'on',
+            bf16=args.bf16 or ('auto' if tuned else 'off'),
+            intra_op_threads=args.intra_op_threads,
+            inter_op_threads=args.inter_op_threads,
+            data_threads=args.data_threads,
+            tune_threads=tuned
+        )
+
+    def apply(self):
+        """Set threads and the precision policy; call before building the model"""
+        import tensorflow as tf
+        if self.intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(self.intra_op_threads)
+        if self.inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(self.inter_op_threads)
+        tf.keras.mixed_precision.set_global_policy('mixed_bfloat16' if self.mixed_bfloat16 else 'float32')
+        print(f"CPU training profile: {self.describe()}")
+
+    def dataset_options(self):
+        """tf.data options giving the input pipeline its own, bounded thread pool"""
+        import tensorflow as tf
+        options = tf.data.Options()
+        if self.data_threads:
+            options.threading.private_threadpool_size = self.data_threads
+        return options
+
+    def describe(self):
+        return {
+            'jit_compile': self.jit_compile,
+            'mixed_bfloat16': self.mixed_bfloat16,
+            'intra_op_threads': self.intra_op_threads,
+            'inter_op_threads': self.inter_op_threads,
+            'data_threads': self.data_threads,
+            'onednn': os.environ.get('TF_ENABLE_ONEDNN_OPTS', 'default')
+        }
+
+
+def throughput_callback(samples_per_epoch=None, batch_size=None):
+    """Keras callback printing training images/sec per epoch and adding it to the history
+
+    Only the training steps are timed, not the validation pass.
+    """
+    import tensorflow as tf
+
+    class ThroughputCallback(tf.keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.steps = 0
+            self.started = time.perf_counter()
+            self.finished = self.started
+
+        def on_train_batch_end(self, batch, logs=None):
+            self.steps += 1
+            self.finished = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            images = self.steps * batch_size if batch_size else self.steps
+            if samples_per_epoch:
+                images = min(images, samples_per_epoch)
+            rate = images / max(self.finished - self.started, 1e-9)
+            unit = 'images' if batch_size else 'steps'
+            print(f"  epoch {epoch + 1}: {rate:.1f} {unit}/sec")
+            if logs is not None:
+                logs[f'{unit}_per_sec'] = rate
+
+    return ThroughputCallback()
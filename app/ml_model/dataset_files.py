@@ -0,0 +1,31 @@
+"""Dataset layout and train/validation split, without TensorFlow.
+
+Shared by the tf.data loaders and the tools that must run on boxes with only
+the TFLite or ONNX runtime (e.g. `python -m app.ml_model.evaluate`).
+"""
+import os
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+CLASSES = ['cardboard', 'glass', 'metal', 'paper', 'plastic', 'trash']
+
+
+def list_files(dataset_path, classes=CLASSES, validation_split=0.2):
+    """Split image paths per class like flow_from_directory's validation_split
+
+    Within every class the sorted file list is cut so that the first
+    ``validation_split`` share goes to validation and the rest to training.
+    Labels are indices into ``classes``.
+    Returns ((train_paths, train_labels), (val_paths, val_labels)).
+    """
+    train_paths, train_labels, val_paths, val_labels = [], [], [], []
+    for label, class_name in enumerate(classes):
+        class_path = os.path.join(dataset_path, class_name)
+        if not os.path.isdir(class_path):
+            continue
+        files = sorted(f for f in os.listdir(class_path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        split = int(validation_split * len(files))
+        val_paths += [os.path.join(class_path, f) for f in files[:split]]
+        val_labels += [label] * split
+        train_paths += [os.path.join(class_path, f) for f in files[split:]]
+        train_labels += [label] * (len(files) - split)
+    return (train_paths, train_labels), (val_paths, val_labels)
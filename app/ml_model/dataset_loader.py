@@ -1,13 +1,24 @@
 import os
+import time
 import numpy as np
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
+from tensorflow.keras import layers
 import tensorflow as tf
 
+try:
+    from preprocess import enhance_array, enhance_batch
+    from dataset_files import CLASSES, list_files
+except ImportError:
+    from app.ml_model.preprocess import enhance_array, enhance_batch
+    from app.ml_model.dataset_files import CLASSES, list_files
+
 class TrashNetLoader:
-    def __init__(self, dataset_path, image_size=(224, 224)):
+    def __init__(self, dataset_path, image_size=(224, 224), enhance=False):
         self.dataset_path = dataset_path
         self.image_size = image_size
-        self.classes = ['cardboard', 'glass', 'metal', 'paper', 'plastic', 'trash']
+        # Apply the CLAHE + blur enhancement stage to every decoded image (tf.data loaders only)
+        self.enhance = enhance
+        self.classes = list(CLASSES)
         self.class_indices = {cls: idx for idx, cls in enumerate(self.classes)}
     
     def load_dataset(self, validation_split=0.2, batch_size=32):
@@ -53,6 +64,158 @@ class TrashNetLoader:
         
         return train_generator, val_generator
     
+    def list_files(self, validation_split=0.2):
+        """Split image paths per class like flow_from_directory's validation_split (see dataset_files.list_files)"""
+        return list_files(self.dataset_path, self.classes, validation_split)
+    
+    def _decode(self, path, label):
+        data = tf.io.read_file(path)
+        img = tf.io.decode_image(data, channels=3, expand_animations=False)
+        # Nearest-neighbour resize, as in flow_from_directory and the serving path
+        img = tf.image.resize(img, self.image_size, method='nearest')
+        img = tf.cast(img, tf.uint8)
+        if self.enhance:
+            img = tf.numpy_function(enhance_array, [img], tf.uint8)
+            img.set_shape((*self.image_size, 3))
+        return img, tf.one_hot(label, len(self.classes))
+    
+    def build_augmentation(self, seed=None):
+        """Batched equivalent of the ImageDataGenerator augmentation in load_dataset
+        
+        shear_range=0.2 is in degrees there, which is visually a no-op, so it is left out.
+        """
+        return tf.keras.Sequential([
+            layers.RandomFlip('horizontal', seed=seed),
+            layers.RandomRotation(20 / 360, fill_mode='nearest', seed=seed),
+            layers.RandomTranslation(0.2, 0.2, fill_mode='nearest', seed=seed),
+            layers.RandomZoom(0.2, fill_mode='nearest', seed=seed)
+        ], name='augmentation')
+    
+    def image_batches(self, paths, batch_size=32, augment_seed=None):
+        """Scaled image batches of ``paths`` in order, optionally with one seeded augmentation pass"""
+        autotune = tf.data.AUTOTUNE
+        ds = tf.data.Dataset.from_tensor_slices((paths, [0] * len(paths)))
+        ds = ds.map(self._decode, num_parallel_calls=autotune).batch(batch_size)
+        ds = ds.map(lambda x, _: tf.cast(x, tf.float32) / 255.0, num_parallel_calls=autotune)
+        if augment_seed is not None:
+            augmentation = self.build_augmentation(seed=augment_seed)
+            ds = ds.map(lambda x: augmentation(x, training=True), num_parallel_calls=autotune)
+        return ds.prefetch(autotune)
+    
+    def load_tf_dataset(self, validation_split=0.2, batch_size=32, cache=True, seed=42,
+                        repeat=False, skip_batches=0):
+        """tf.data version of load_dataset: same class order, split and 1/255 scaling
+        
+        JPEGs are decoded in parallel and cached after decoding (``cache`` may be
+        True for memory or a file path), augmentation runs on whole batches and
+        batches are prefetched while the model trains.
+        
+        With ``repeat`` the training set is an endless, seeded stream of full
+        batches (use steps_per_epoch), and ``skip_batches`` resumes it at that
+        position, e.g. after restoring a checkpoint.
+        """
+        autotune = tf.data.AUTOTUNE
+        (train_paths, train_labels), (val_paths, val_labels) = self.list_files(validation_split)
+        augmentation = self.build_augmentation()
+        
+        def pipeline(paths, labels, training):
+            ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+            ds = ds.map(self._decode, num_parallel_calls=autotune)
+            if cache:
+                ds = ds.cache() if cache is True else ds.cache(f"{cache}_{'train' if training else 'val'}")
+            if training:
+                ds = ds.shuffle(len(paths), seed=seed, reshuffle_each_iteration=True)
+                if repeat:
+                    ds = ds.repeat().skip(skip_batches * batch_size)
+            ds = ds.batch(batch_size)
+            ds = ds.map(lambda x, y: (tf.cast(x, tf.float32) / 255.0, y), num_parallel_calls=autotune)
+            if training:
+                ds = ds.map(lambda x, y: (augmentation(x, training=True), y), num_parallel_calls=autotune)
+            return ds.prefetch(autotune)
+        
+        train_ds = pipeline(train_paths, train_labels, training=True)
+        val_ds = pipeline(val_paths, val_labels, training=False)
+        print(f"tf.data pipeline: {len(train_paths)} training / {len(val_paths)} validation images")
+        return train_ds, val_ds
+    
+    def load_shard_dataset(self, shard_dir, validation_split=0.2, batch_size=32, seed=42,
+                           repeat=False, skip_batches=0):
+        """tf.data pipelines streaming pre-decoded images from compiled shards
+        
+        See dataset_shards.py; images are memory-mapped, so there is no decode
+        cost and memory use stays at a few batches regardless of dataset size.
+        ``repeat`` and ``skip_batches`` work as in load_tf_dataset; every epoch
+        is ceil(n / batch_size) batches with its own seeded order.
+        """
+        try:
+            from dataset_shards import ShardedDataset
+        except ImportError:
+            from app.ml_model.dataset_shards import ShardedDataset
+        shards = ShardedDataset(shard_dir)
+        if shards.classes != self.classes or shards.image_size != tuple(self.image_size):
+            raise ValueError(f"Shards in {shard_dir} were compiled for other classes or image size")
+        train_indices, val_indices = shards.split_indices(validation_split)
+        augmentation = self.build_augmentation()
+        autotune = tf.data.AUTOTUNE
+        signature = (
+            tf.TensorSpec((None, *self.image_size, 3), tf.uint8),
+            tf.TensorSpec((None,), tf.int16)
+        )
+        
+        def pipeline(indices, training):
+            steps = -(-len(indices) // batch_size)
+            skip = skip_batches if training and repeat else 0
+            epoch = {'count': skip // steps}
+            
+            def generator():
+                start_batch = skip % steps
+                while True:
+                    epoch['count'] += 1
+                    yield from shards.iter_batches(indices, batch_size, shuffle=training,
+                                                   seed=seed + epoch['count'], start_batch=start_batch)
+                    start_batch = 0
+                    if not (training and repeat):
+                        return
+            
+            ds = tf.data.Dataset.from_generator(generator, output_signature=signature)
+            if self.enhance:
+                ds = ds.map(lambda x, y: (tf.ensure_shape(tf.numpy_function(
+                    lambda batch: np.stack(enhance_batch(batch)), [x], tf.uint8), signature[0].shape), y))
+            ds = ds.map(lambda x, y: (tf.cast(x, tf.float32) / 255.0, tf.one_hot(tf.cast(y, tf.int32), len(self.classes))),
+                        num_parallel_calls=autotune)
+            if training:
+                ds = ds.map(lambda x, y: (augmentation(x, training=True), y), num_parallel_calls=autotune)
+            return ds.prefetch(autotune)
+        
+        print(f"Shard pipeline: {len(train_indices)} training / {len(val_indices)} validation images")
+        return pipeline(train_indices, True), pipeline(val_indices, False)
+    
+    def benchmark_input_pipelines(self, batch_size=32, num_batches=50, epochs=2):
+        """Compare training input throughput (images/sec) of ImageDataGenerator vs tf.data
+        
+        The tf.data pipeline is measured over full epochs (a partial pass would
+        leave cache() unfinished), so the first epoch shows the cold decode cost
+        and later ones the cached throughput.
+        """
+        def measure(iterator, batches):
+            started = time.perf_counter()
+            images = 0
+            for _ in range(batches):
+                x, _ = next(iterator)
+                images += len(x)
+            return images / (time.perf_counter() - started)
+        
+        train_gen, _ = self.load_dataset(batch_size=batch_size)
+        results = {'image_data_generator': measure(iter(train_gen), min(num_batches, len(train_gen)))}
+        
+        train_ds, _ = self.load_tf_dataset(batch_size=batch_size)
+        for epoch in range(epochs):
+            results[f'tf_data_epoch_{epoch + 1}'] = measure(iter(train_ds), int(train_ds.cardinality()))
+        
+        for name, rate in results.items():
+            print(f"  {name}: {rate:.1f} images/sec")
+        return results
+    
     def get_class_distribution(self):
         """Get the distribution of classes in the dataset"""
         class_counts = {}
@@ -88,7 +251,8 @@ class TrashNetLoader:
 if __name__ == "__main__":
     # Initialize dataset loader
     # Note: Update the path to your actual TrashNet dataset location
-    dataset_path = "path/to/your/trashnet/dataset"
+    import sys
+    dataset_path = sys.argv[1] if len(sys.argv) > 1 else "path/to/your/trashnet/dataset"
     
     if os.path.exists(dataset_path):
         loader = TrashNetLoader(dataset_path)
@@ -101,6 +265,10 @@ if __name__ == "__main__":
         
         print(f"\nTraining batches: {len(train_gen)}")
         print(f"Validation batches: {len(val_gen)}")
+        
+        if '--benchmark' in sys.argv:
+            print("\nInput pipeline throughput:")
+            loader.benchmark_input_pipelines()
     else:
         print(f"Dataset path {dataset_path} does not exist.")
         print("Please download the TrashNet dataset and update the path.")
\ No newline at end of file
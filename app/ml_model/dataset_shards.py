@@ -0,0 +1,270 @@
+"""Pre-decoded, memory-mapped dataset shards.
+
+`compile` decodes every image under the dataset once, resizes it to IMAGE_SIZE
+and writes uint8 arrays plus labels into fixed-size .npy shards with a JSON
+index. Re-running it only decodes images whose size/mtime (and then content
+hash) changed, and only rewrites shards whose images changed. Rows follow
+the sorted dataset order, so adding or removing an image rewrites the shards
+from that point on. Training and evaluation memory-map the shards, so there
+is no JPEG decode cost and nothing has to fit in RAM at once.
+
+Usage (from the project root):
+    python -m app.ml_model.dataset_shards dataset dataset_shards
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+INDEX_FILE = 'index.json'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def decode_resized(path, image_size):
+    """Decode to RGB uint8 with the same nearest-neighbour resize as the serving path"""
+    with Image.open(path) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        width_height = (image_size[1], image_size[0])
+        if img.size != width_height:
+            img = img.resize(width_height, Image.NEAREST)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def load_index(shard_dir):
+    path = os.path.join(shard_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compile_dataset(dataset_dir, shard_dir, image_size=(224, 224), shard_size=512, classes=None, workers=8):
+    """Build or incrementally update the shards for ``dataset_dir``; returns the new index"""
+    if classes is None:
+        # Same ordering as flow_from_directory / TrashNetLoader.classes
+        classes = sorted(d for d in os.listdir(dataset_dir) if os.path.isdir(os.path.join(dataset_dir, d)))
+    os.makedirs(shard_dir, exist_ok=True)
+
+    try:
+        previous = load_index(shard_dir)
+    except ValueError:
+        # An unreadable index is rebuilt from scratch
+        previous = None
+    if previous is not None and (previous['image_size'] != list(image_size) or previous['classes'] != classes):
+        previous = None
+    old_entries = {e['path']: e for e in previous['entries']} if previous else {}
+    old_shards = {}
+
+    def old_row(entry):
+        shard = entry['shard']
+        if shard not in old_shards:
+            old_shards[shard] = np.load(os.path.join(shard_dir, previous['shards'][shard]['images']), mmap_mode='r')
+        return old_shards[shard][entry['row']]
+
+    # Work out what can be reused and what has to be decoded again
+    entries, sources = [], []
+    reused = 0
+    for label, class_name in enumerate(classes):
+        class_dir = os.path.join(dataset_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for name in sorted(os.listdir(class_dir)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(class_dir, name)
+            stat = os.stat(path)
+            entry = {'path': path, 'class': class_name, 'label': label,
+                     'mtime': stat.st_mtime, 'size': stat.st_size}
+            old = old_entries.get(path)
+            if old is not None and old['label'] == label:
+                if old['mtime'] == entry['mtime'] and old['size'] == entry['size']:
+                    entry['sha1'] = old['sha1']
+                else:
+                    entry['sha1'] = file_sha1(path)
+                if entry['sha1'] == old['sha1']:
+                    if old.get('corrupt'):
+                        entry['corrupt'] = True
+                    entries.append(entry)
+                    sources.append(old)
+                    reused += 1
+                    continue
+            entry.setdefault('sha1', file_sha1(path))
+            entries.append(entry)
+            sources.append(None)
+
+    def unchanged_shard(chunk):
+        """The previous shard holding exactly the images of ``chunk`` in the same rows, or None"""
+        first = sources[chunk[0]]
+        if first is None or previous['shards'][first['shard']]['count'] != len(chunk):
+            return None
+        for row, i in enumerate(chunk):
+            if sources[i] is None or sources[i]['shard'] != first['shard'] or sources[i]['row'] != row:
+                return None
+        return previous['shards'][first['shard']]
+
+    # New shards never reuse the name of a file on disk, even one of a discarded index
+    generations = [int(name.split('-')[1]) for name in os.listdir(shard_dir)
+                   if name.startswith('shard-') and name.endswith('.npy') and name.split('-')[1].isdigit()]
+    generation = max(generations, default=0) + 1
+    shards = []
+    kept = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for shard_index, start in enumerate(range(0, len(entries), shard_size)):
+            chunk = list(range(start, min(start + shard_size, len(entries))))
+            shard = unchanged_shard(chunk)
+            if shard is not None:
+                for row, i in enumerate(chunk):
+                    entries[i]['shard'] = shard_index
+                    entries[i]['row'] = row
+                shards.append(dict(shard))
+                kept += 1
+                continue
+            names = {'images': f'shard-{generation:04d}-{shard_index:04d}.images.npy',
+                     'labels': f'shard-{generation:04d}-{shard_index:04d}.labels.npy'}
+            images = np.lib.format.open_memmap(os.path.join(shard_dir, names['images']), mode='w+',
+                                               dtype=np.uint8, shape=(len(chunk), *image_size, 3))
+            labels = np.empty(len(chunk), dtype=np.int16)
+
+            to_decode = [i for i in chunk if sources[i] is None]
+            decoded = dict(zip(to_decode, pool.map(lambda i: _try_decode(entries[i]['path'], image_size), to_decode)))
+            for row, i in enumerate(chunk):
+                array = old_row(sources[i]) if sources[i] is not None else decoded[i]
+                if array is None:
+                    array = np.zeros((*image_size, 3), dtype=np.uint8)
+                    entries[i]['corrupt'] = True
+                images[row] = array
+                labels[row] = entries[i]['label']
+                entries[i]['shard'] = shard_index
+                entries[i]['row'] = row
+            images.flush()
+            del images
+            np.save(os.path.join(shard_dir, names['labels']), labels)
+            shards.append(dict(names, count=len(chunk)))
+
+    index = {
+        'generation': generation,
+        'image_size': list(image_size),
+        'classes': classes,
+        'shard_size': shard_size,
+        'shards': shards,
+        'entries': entries
+    }
+    # The index is swapped in atomically; only then are the shards it no longer uses removed
+    tmp_path = os.path.join(shard_dir, INDEX_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(shard_dir, INDEX_FILE))
+    old_shards.clear()
+    failed = [entry['path'] for entry in entries if entry.get('corrupt')]
+    # Also covers shards of an index that was discarded (changed image size or classes, unreadable)
+    in_use = {shard[key] for shard in shards for key in ('images', 'labels')}
+    for name in os.listdir(shard_dir):
+        if name.startswith('shard-') and name.endswith('.npy') and name not in in_use:
+            os.remove(os.path.join(shard_dir, name))
+
+    print(f"✅ Compiled {len(entries)} images into {len(shards)} shards "
+          f"({reused} reused, {len(entries) - reused} decoded, {len(failed)} unreadable, "
+          f"{len(shards) - kept} shards written)")
+    return index
+
+
+def _try_decode(path, image_size):
+    try:
+        return decode_resized(path, image_size)
+    except Exception as e:
+        print(f"⚠️ Could not decode {path}: {e}")
+        return None
+
+
+class ShardedDataset:
+    """Read-only, memory-mapped view of compiled shards"""
+
+    def __init__(self, shard_dir):
+        self.shard_dir = shard_dir
+        self.index = load_index(shard_dir)
+        if self.index is None:
+            raise FileNotFoundError(f"No compiled dataset in {shard_dir}")
+        self.classes = self.index['classes']
+        self.image_size = tuple(self.index['image_size'])
+        self.images = [np.load(os.path.join(shard_dir, s['images']), mmap_mode='r') for s in self.index['shards']]
+        self.labels = np.concatenate([np.load(os.path.join(shard_dir, s['labels'])) for s in self.index['shards']]) \
+            if self.index['shards'] else np.empty(0, dtype=np.int16)
+        self.entries = self.index['entries']
+        self.offsets = np.cumsum([0] + [s['count'] for s in self.index['shards']])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def split_indices(self, validation_split=0.2):
+        """Same per-class split as TrashNetLoader.list_files: first share of each sorted class is validation
+
+        The split is made over all files, as list_files does, and unreadable
+        images are dropped afterwards, so both see the same validation images.
+        """
+        per_class = {}
+        for i, entry in enumerate(self.entries):
+            per_class.setdefault(entry['label'], []).append(i)
+        train, val = [], []
+        for label in sorted(per_class):
+            indices = per_class[label]
+            split = int(validation_split * len(indices))
+            val += indices[:split]
+            train += indices[split:]
+        def readable(indices):
+            return np.array([i for i in indices if not self.entries[i].get('corrupt')], dtype=np.int64)
+
+        return readable(train), readable(val)
+
+    def gather(self, indices):
+        """Copy the images for global ``indices`` into one (N, H, W, 3) uint8 array"""
+        batch = np.empty((len(indices), *self.image_size, 3), dtype=np.uint8)
+        shard_ids = np.searchsorted(self.offsets, indices, side='right') - 1
+        for shard in np.unique(shard_ids):
+            mask = shard_ids == shard
+            rows = indices[mask] - self.offsets[shard]
+            order = np.argsort(rows)
+            # Sorted reads keep memory-mapped access sequential
+            batch[np.flatnonzero(mask)[order]] = self.images[shard][rows[order]]
+        return batch
+
+    def iter_batches(self, indices=None, batch_size=32, shuffle=False, seed=None, start_batch=0):
+        """Yield (images uint8, labels) batches without loading the whole dataset
+
+        ``start_batch`` skips the first batches of the (seeded) order without reading them.
+        """
+        if indices is None:
+            indices = np.arange(len(self))
+        indices = np.asarray(indices)
+        if shuffle:
+            indices = np.random.default_rng(seed).permutation(indices)
+        for start in range(start_batch * batch_size, len(indices), batch_size):
+            batch_indices = indices[start:start + batch_size]
+            yield self.gather(batch_indices), self.labels[batch_indices]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the image dataset into memory-mapped shards")
+    parser.add_argument('dataset_dir', nargs='?', default='dataset')
+    parser.add_argument('shard_dir', nargs='?', default='dataset_shards')
+    parser.add_argument('--image-size', type=int, nargs=2, default=(224, 224))
+    parser.add_argument('--shard-size', type=int, default=512)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args(argv)
+    compile_dataset(args.dataset_dir, args.shard_dir, tuple(args.image_size), args.shard_size, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
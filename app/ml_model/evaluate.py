@@ -0,0 +1,282 @@
+"""Accuracy-vs-latency evaluation of every model variant and preprocessing path.
+
+Runs the validation split of the dataset (same split as training) through each
+model variant (keras, tflite, tflite_fp16, tflite_int8, onnx) combined with
+each preprocessing path and reports:
+
+- accuracy, per-class accuracy and the confusion matrix,
+- calibration: expected calibration error, negative log-likelihood and
+  per-confidence-bin accuracy,
+- decode throughput per decode path, and inference throughput and batch /
+  single-image latency per variant.
+
+Preprocessing paths differ in how JPEGs are decoded (DCT-domain downscaling
+as served, a full decode as in training, or the web UI's browser resize
+followed by a WebP/JPEG re-encode at CLIENT_UPLOAD_QUALITY) and how pixels
+are scaled (MobileNetV2 preprocess_input to [-1, 1] as served, or 1/255 as in
+training), so the cost of each speed-up shows up as an accuracy number next
+to it.
+
+Usage (from the project root):
+    python -m app.ml_model.evaluate
+    python -m app.ml_model.evaluate --variants keras tflite_int8 --preprocessing serving training
+    python -m app.ml_model.evaluate --version 20250101-120000-ab12cd34 --output benchmarks/results/eval.json
+    python -m app.ml_model.evaluate --preprocessing serving client_resize --client-quality 0.8
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import numpy as np
+from PIL import Image, features
+from config import Config
+from app.backends import load_backend
+from app.model_store import ModelStore
+from app.ml_model.dataset_files import CLASSES, list_files
+from app.ml_model.preprocess import ImagePreprocessor, decode_pool, preprocess_input
+
+# name: (decode path, pixel scaling)
+PREPROCESSING = {
+    'serving': ('fast', 'mobilenet'),       # what /classify does for full-size uploads
+    'full_decode': ('full', 'mobilenet'),   # serving scaling without the fast JPEG decode
+    'client_resize': ('client', 'mobilenet'),  # what /classify gets from the web UI
+    'training': ('full', 'unit'),           # ImageDataGenerator(rescale=1./255) as used in training
+    'training_fast_decode': ('fast', 'unit')
+}
+CALIBRATION_BINS = 10
+
+
+def scale_pixels(images, scaling):
+    """float32 model input from uint8 images"""
+    batch = images.astype(np.float32)
+    if scaling == 'mobilenet':
+        return preprocess_input(batch)
+    batch /= 255.0
+    return batch
+
+
+def client_upload(img, quality):
+    """Round-trip a model-sized image through the web UI's upload encoding
+    
+    The browser resizes the full image with nearest-neighbour scaling (the same
+    as a full decode here) and encodes it as WebP, or JPEG without WebP support.
+    """
+    buffer = io.BytesIO()
+    image_format = 'WEBP' if features.check('webp') else 'JPEG'
+    Image.fromarray(img).save(buffer, format=image_format, quality=int(round(quality * 100)))
+    with Image.open(buffer) as uploaded:
+        return np.asarray(uploaded.convert('RGB'))
+
+
+def decode_split(paths, decode_path, client_quality=Config.CLIENT_UPLOAD_QUALITY):
+    """Decode ``paths`` to uint8 on the serving decode pool; returns (images, readable mask, seconds)"""
+    preprocessor = ImagePreprocessor(target_size=Config.IMAGE_SIZE, fast_decode=decode_path == 'fast')
+    images = np.empty((len(paths), *Config.IMAGE_SIZE, 3), dtype=np.uint8)
+    keep = np.ones(len(paths), dtype=bool)
+
+    def decode(path):
+        try:
+            img = preprocessor.decode(path)
+            return client_upload(img, client_quality) if decode_path == 'client' else img
+        except Exception as e:
+            print(f"⚠️ Could not decode {path}: {e}")
+            return None
+
+    started = time.perf_counter()
+    for index, image in enumerate(decode_pool(Config.PREPROCESS_WORKERS).map(decode, paths)):
+        if image is None:
+            keep[index] = False
+        else:
+            images[index] = image
+    return images, keep, time.perf_counter() - started
+
+
+def run_model(backend, inputs, batch_size, latency_samples=50):
+    """Probabilities for ``inputs`` plus timings of batched and single-image inference"""
+    backend.predict(inputs[:batch_size])  # warmup
+    batch_ms = []
+    outputs = []
+    started = time.perf_counter()
+    for start in range(0, len(inputs), batch_size):
+        batch_started = time.perf_counter()
+        outputs.append(np.asarray(backend.predict(inputs[start:start + batch_size]), dtype=np.float64))
+        batch_ms.append((time.perf_counter() - batch_started) * 1000)
+    elapsed = time.perf_counter() - started
+
+    backend.predict(inputs[:1])
+    single_ms = []
+    for index in range(min(latency_samples, len(inputs))):
+        single_started = time.perf_counter()
+        backend.predict(inputs[index:index + 1])
+        single_ms.append((time.perf_counter() - single_started) * 1000)
+
+    timings = {
+        'images_per_sec': round(len(inputs) / max(elapsed, 1e-9), 2),
+        'batch_size': batch_size,
+        'batch_latency_ms': latency_summary(batch_ms),
+        'single_image_latency_ms': latency_summary(single_ms)
+    }
+    return np.concatenate(outputs), timings
+
+
+def latency_summary(values_ms):
+    values = np.asarray(values_ms, dtype=np.float64)
+    if not len(values):
+        return {}
+    return {
+        'mean': round(float(values.mean()), 3),
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p95': round(float(np.percentile(values, 95)), 3),
+        'p99': round(float(np.percentile(values, 99)), 3)
+    }
+
+
+def accuracy_report(probabilities, labels, class_names):
+    """Accuracy, per-class accuracy, confusion matrix and calibration of ``probabilities``"""
+    predicted = np.argmax(probabilities, axis=1)
+    confidence = probabilities[np.arange(len(labels)), predicted]
+    correct = predicted == labels
+    num_classes = len(class_names)
+
+    confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+    np.add.at(confusion, (labels, predicted), 1)
+    per_class = {}
+    for index, name in enumerate(class_names):
+        total = int(confusion[index].sum())
+        per_class[name] = round(float(confusion[index, index] / total), 4) if total else None
+
+    bins = []
+    ece = 0.0
+    edges = np.linspace(0.0, 1.0, CALIBRATION_BINS + 1)
+    for low, high in zip(edges[:-1], edges[1:]):
+        in_bin = (confidence > low) & (confidence <= high)
+        count = int(in_bin.sum())
+        if not count:
+            continue
+        bin_accuracy = float(correct[in_bin].mean())
+        bin_confidence = float(confidence[in_bin].mean())
+        ece += count / len(labels) * abs(bin_accuracy - bin_confidence)
+        bins.append({'range': [round(low, 2), round(high, 2)], 'count': count,
+                     'accuracy': round(bin_accuracy, 4), 'confidence': round(bin_confidence, 4)})
+    true_probability = np.clip(probabilities[np.arange(len(labels)), labels], 1e-12, 1.0)
+
+    return {
+        'accuracy': round(float(correct.mean()), 4),
+        'balanced_accuracy': round(float(np.mean([a for a in per_class.values() if a is not None])), 4),
+        'per_class_accuracy': per_class,
+        'confusion_matrix': {'labels': class_names, 'rows_true_columns_predicted': confusion.tolist()},
+        'calibration': {
+            'ece': round(ece, 4),
+            'nll': round(float(-np.log(true_probability).mean()), 4),
+            'mean_confidence': round(float(confidence.mean()), 4),
+            'bins': bins
+        }
+    }
+
+
+def variant_paths(variants, version=None):
+    """{variant: model path} for the requested variants whose file exists"""
+    store = ModelStore(Config.MODEL_STORE_DIR)
+    paths = {}
+    for variant in variants:
+        path = store.model_path(version, variant) if version else Config.MODEL_VARIANTS[variant]
+        if os.path.exists(path):
+            paths[variant] = path
+        else:
+            print(f"⚠️ {variant}: {path} not found, skipped")
+    return paths
+
+
+def evaluate(dataset_dir='dataset', variants=None, preprocessing=None, version=None,
+             validation_split=0.2, batch_size=64, limit=None, client_quality=Config.CLIENT_UPLOAD_QUALITY):
+    # TF-free, so the TFLite and ONNX variants can be evaluated without TensorFlow
+    _, (paths, labels) = list_files(dataset_dir, validation_split=validation_split)
+    if limit:
+        # Evenly spaced, so every class stays represented
+        picked = np.linspace(0, len(paths) - 1, min(limit, len(paths))).astype(int)
+        paths, labels = [paths[i] for i in picked], [labels[i] for i in picked]
+    labels = np.asarray(labels)
+    class_names = [Config.WASTE_CATEGORIES[i] for i in range(len(CLASSES))]
+    preprocessing = preprocessing or list(PREPROCESSING)
+    model_paths = variant_paths(variants or list(Config.MODEL_VARIANTS), version)
+    print(f"Evaluating {len(paths)} validation images, variants {list(model_paths)}, preprocessing {preprocessing}")
+
+    report = {'dataset': dataset_dir, 'images': len(paths), 'model_version': version,
+              'client_quality': client_quality, 'decode': {}, 'results': []}
+    decoded = {}
+    for decode_path in sorted({PREPROCESSING[name][0] for name in preprocessing}):
+        images, keep, seconds = decode_split(paths, decode_path, client_quality)
+        decoded[decode_path] = (images[keep], labels[keep])
+        report['decode'][decode_path] = {
+            'images_per_sec': round(len(paths) / max(seconds, 1e-9), 2),
+            'unreadable': int((~keep).sum())
+        }
+
+    for variant, path in model_paths.items():
+        backend = load_backend(variant, path, num_threads=Config.INFERENCE_THREADS)
+        for name in preprocessing:
+            decode_path, scaling = PREPROCESSING[name]
+            images, kept_labels = decoded[decode_path]
+            probabilities, timings = run_model(backend, scale_pixels(images, scaling), batch_size)
+            result = {'variant': variant, 'preprocessing': name, 'model_path': path,
+                      'size_mb': round(os.path.getsize(path) / (1024 * 1024), 2)}
+            result.update(accuracy_report(probabilities, kept_labels, class_names))
+            result['performance'] = timings
+            report['results'].append(result)
+            print(f"  {variant:12s} {name:21s} acc {result['accuracy']:.2%}  "
+                  f"ece {result['calibration']['ece']:.3f}  {timings['images_per_sec']:8.1f} img/s  "
+                  f"p50 single {timings['single_image_latency_ms'].get('p50', 0):.2f} ms")
+    return report
+
+
+def print_confusion(result):
+    matrix = result['confusion_matrix']
+    names = [name[:8] for name in matrix['labels']]
+    print(f"\n{result['variant']} / {result['preprocessing']} (rows: true, columns: predicted)")
+    print(' ' * 10 + ''.join(f'{name:>9s}' for name in names) + '  accuracy')
+    for name, row, accuracy in zip(names, matrix['rows_true_columns_predicted'],
+                                   result['per_class_accuracy'].values()):
+        print(f'{name:10s}' + ''.join(f'{count:9d}' for count in row)
+              + (f'  {accuracy:8.2%}' if accuracy is not None else ''))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Accuracy, calibration and speed of each model variant")
+    parser.add_argument('--dataset', default='dataset')
+    parser.add_argument('--variants', nargs='+', choices=sorted(Config.MODEL_VARIANTS),
+                        help="Default: every variant that has been exported")
+    parser.add_argument('--preprocessing', nargs='+', choices=list(PREPROCESSING), help="Default: all")
+    parser.add_argument('--version', help="Evaluate a published model version instead of MODEL_PATH / EXPORT_DIR")
+    parser.add_argument('--validation-split', type=float, default=0.2)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--limit', type=int, help="Evaluate at most this many images")
+    parser.add_argument('--client-quality', type=float, default=Config.CLIENT_UPLOAD_QUALITY,
+                        help="Upload quality of the client_resize path (default: CLIENT_UPLOAD_QUALITY)")
+    parser.add_argument('--output', help="Write the full report as JSON")
+    parser.add_argument('--min-accuracy', type=float,
+                        help="Exit with an error if the 'serving' path of any variant is below this accuracy")
+    args = parser.parse_args(argv)
+
+    report = evaluate(args.dataset, args.variants, args.preprocessing, args.version,
+                      args.validation_split, args.batch_size, args.limit, args.client_quality)
+    for result in report['results']:
+        print_confusion(result)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+    if args.min_accuracy is not None:
+        below = [r['variant'] for r in report['results']
+                 if r['preprocessing'] == 'serving' and r['accuracy'] < args.min_accuracy]
+        if below:
+            print(f"❌ Serving accuracy below {args.min_accuracy:.2%}: {', '.join(below)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Export the trained Keras model to TFLite (fp32, fp16, int8) and ONNX.
+
+Every exported variant is checked against the Keras model on held-out images
+from the validation split (the one training used, so the model never saw
+them) and is only written to Config.EXPORT_DIR when its top-1
+agreement reaches the threshold.
+
+Usage (from the project root):
+    python -m app.ml_model.export_model --variants tflite tflite_fp16 tflite_int8 onnx
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import numpy as np
+import tensorflow as tf
+from config import Config
+from app.backends import load_backend
+from app.ml_model.dataset_loader import TrashNetLoader
+from app.ml_model.preprocess import ImagePreprocessor
+
+
+def split_samples(dataset_dir, calibration_size, holdout_size, validation_split=0.2, seed=42):
+    """Calibration paths from the training split, held-out paths from the validation split"""
+    (train_paths, _), (val_paths, _) = TrashNetLoader(dataset_dir).list_files(validation_split)
+    rng = random.Random(seed)
+    rng.shuffle(train_paths)
+    rng.shuffle(val_paths)
+    return train_paths[:calibration_size], val_paths[:holdout_size]
+
+
+def load_images(paths, image_size):
+    preprocessor = ImagePreprocessor(target_size=image_size)
+    batch, _ = preprocessor.preprocess_batch(paths)
+    if batch is None:
+        raise RuntimeError("No images could be loaded from the dataset")
+    return batch.astype(np.float32)
+
+
+def convert_tflite(model, variant, calibration):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant == 'tflite_fp16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == 'tflite_int8':
+        def representative_dataset():
+            for i in range(len(calibration)):
+                yield [calibration[i:i + 1]]
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def export_variant(model, variant, output_path, calibration):
+    """Write ``variant`` of ``model`` to output_path"""
+    if variant.startswith('tflite'):
+        with open(output_path, 'wb') as f:
+            f.write(convert_tflite(model, variant, calibration))
+    elif variant == 'onnx':
+        import tf2onnx
+        spec = (tf.TensorSpec((None, *model.input_shape[1:]), tf.float32, name='input'),)
+        tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=output_path)
+    else:
+        raise ValueError(f"Unknown export variant: {variant}")
+
+
+def top1_agreement(reference, backend, images, batch_size=32):
+    predictions = np.concatenate([backend.predict(images[i:i + batch_size])
+                                  for i in range(0, len(images), batch_size)])
+    return float(np.mean(np.argmax(predictions, axis=1) == reference))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the waste classifier for TFLite / ONNX Runtime")
+    parser.add_argument('--model', default=Config.MODEL_PATH)
+    parser.add_argument('--dataset', default='dataset')
+    parser.add_argument('--variants', nargs='+', default=['tflite', 'tflite_fp16', 'tflite_int8', 'onnx'])
+    parser.add_argument('--calibration-size', type=int, default=200)
+    parser.add_argument('--holdout-size', type=int, default=300,
+                        help="Images drawn from the validation split for the agreement check")
+    parser.add_argument('--validation-split', type=float, default=0.2, help="Must match the one used in training")
+    parser.add_argument('--min-agreement', type=float, default=Config.EXPORT_MIN_AGREEMENT)
+    args = parser.parse_args(argv)
+
+    model = tf.keras.models.load_model(args.model)
+    calibration_paths, holdout_paths = split_samples(args.dataset, args.calibration_size, args.holdout_size,
+                                                     args.validation_split)
+    calibration = load_images(calibration_paths, Config.IMAGE_SIZE)
+    holdout = load_images(holdout_paths, Config.IMAGE_SIZE)
+    reference = np.argmax(model.predict(holdout, verbose=0), axis=1)
+    print(f"Calibration images: {len(calibration)}, held-out images: {len(holdout)}")
+
+    os.makedirs(Config.EXPORT_DIR, exist_ok=True)
+    failed = []
+    for variant in args.variants:
+        output_path = Config.MODEL_VARIANTS[variant]
+        # Export next to the target and only move it into place once it passes the check
+        fd, tmp_path = tempfile.mkstemp(dir=Config.EXPORT_DIR, suffix=os.path.splitext(output_path)[1])
+        os.close(fd)
+        try:
+            export_variant(model, variant, tmp_path, calibration)
+            agreement = top1_agreement(reference, load_backend(variant, tmp_path), holdout)
+            size_mb = os.path.getsize(tmp_path) / (1024 * 1024)
+            if agreement < args.min_agreement:
+                print(f"❌ {variant}: top-1 agreement {agreement:.2%} < {args.min_agreement:.2%}, not exported")
+                failed.append(variant)
+                continue
+            os.replace(tmp_path, output_path)
+            print(f"✅ {variant}: {output_path} ({size_mb:.1f} MB, top-1 agreement {agreement:.2%})")
+        except Exception as e:
+            print(f"❌ {variant}: export failed: {e}")
+            failed.append(variant)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
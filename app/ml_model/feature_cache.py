@@ -0,0 +1,66 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+
+class FeatureCache:
+    """On-disk cache of frozen-backbone feature vectors
+
+    Entries are kept per (image, augmentation variant); variant 0 is the
+    unaugmented image. An image is identified by its path, size and mtime,
+    so adding, removing or touching one image only recomputes that image.
+    The input size, backbone and seed form a separate config key: changing
+    any of them starts a new set of entries. Each (config, variant) pair is
+    stored as one .npz file of image keys and their feature vectors.
+    """
+
+    def __init__(self, cache_dir='feature_cache'):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def config_key(image_size, backbone, seed):
+        digest = hashlib.sha1(json.dumps([list(image_size), backbone, seed]).encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def image_key(path):
+        stat = os.stat(path)
+        return hashlib.sha1(f"{path}|{stat.st_size}|{stat.st_mtime}".encode('utf-8')).hexdigest()[:16]
+
+    def path(self, config_key, variant):
+        return os.path.join(self.cache_dir, f"features-{config_key}-v{variant}.npz")
+
+    def load(self, config_key, variant):
+        """{image key: feature vector} stored for ``variant``"""
+        path = self.path(config_key, variant)
+        if not os.path.exists(path):
+            return {}
+        with np.load(path) as data:
+            return dict(zip(data['keys'].tolist(), data['features']))
+
+    def get_or_compute(self, paths, config_key, variant, compute):
+        """Features of ``paths`` for ``variant``, in order
+
+        ``compute(missing_paths)`` is only called for the images that have no
+        entry yet and returns their features in the same order. Augmented
+        variants of new images therefore come from a different random stream
+        than the cached ones, which is still one augmentation per image.
+        """
+        entries = self.load(config_key, variant)
+        keys = [self.image_key(path) for path in paths]
+        missing = [index for index, key in enumerate(keys) if key not in entries]
+        if missing:
+            computed = np.asarray(compute([paths[index] for index in missing]), dtype=np.float32)
+            entries.update(zip((keys[index] for index in missing), computed))
+            self.save(config_key, variant, entries)
+        print(f"  variant {variant}: {len(paths) - len(missing)} cached, {len(missing)} computed")
+        return np.stack([entries[key] for key in keys]).astype(np.float32)
+
+    def save(self, config_key, variant, entries):
+        # Entries of other image sets (e.g. the validation split) share the file and are kept
+        path = self.path(config_key, variant)
+        tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp_path, keys=np.array(list(entries)), features=np.stack(list(entries.values())))
+        os.replace(tmp_path, path)
@@ -1,21 +1,27 @@
 import tensorflow as tf
 import numpy as np
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 from config import Config
+from app.backends import load_backend
+from app.ml_model.preprocess import ImagePreprocessor
 
 class WastePredictor:
-    def __init__(self, model_path=None):
-        self.model_path = model_path or Config.MODEL_PATH
+    def __init__(self, model_path=None, backend=None):
+        self.backend = backend or Config.INFERENCE_BACKEND
+        self.model_path = model_path or Config.MODEL_VARIANTS.get(self.backend, Config.MODEL_PATH)
         self.model = None
+        self.preprocessor = ImagePreprocessor(
+            target_size=Config.IMAGE_SIZE,
+            fast_decode=Config.FAST_JPEG_DECODE,
+            num_workers=Config.PREPROCESS_WORKERS
+        )
         self.load_model()
     
     def load_model(self):
         """Load the trained model"""
         try:
             if tf.io.gfile.exists(self.model_path):
-                self.model = tf.keras.models.load_model(self.model_path)
-                print("✅ Model loaded successfully")
+                self.model = load_backend(self.backend, self.model_path, num_threads=Config.INFERENCE_THREADS)
+                print(f"✅ Model loaded successfully ({self.backend})")
                 return True
             else:
                 print("❌ Model file not found")
@@ -27,11 +33,7 @@ class WastePredictor:
     def preprocess_image(self, image_path):
         """Preprocess image for prediction"""
         try:
-            img = image.load_img(image_path, target_size=Config.IMAGE_SIZE)
-            img_array = image.img_to_array(img)
-            img_array = np.expand_dims(img_array, axis=0)
-            img_array = preprocess_input(img_array)
-            return img_array
+            return self.preprocessor.load_array(image_path)
         except Exception as e:
             print(f"❌ Error preprocessing image: {e}")
             return None
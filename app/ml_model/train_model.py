@@ -1,3 +1,15 @@
+import os
+import sys
+
+try:
+    from cpu_training import CpuTrainingProfile, add_profile_arguments, configure_environment, throughput_callback
+except ImportError:
+    from app.ml_model.cpu_training import CpuTrainingProfile, add_profile_arguments, configure_environment, throughput_callback
+
+if __name__ == "__main__":
+    # oneDNN is configured when TensorFlow is imported, so --onednn has to be applied first
+    configure_environment(sys.argv[1:])
+
 import tensorflow as tf
 from tensorflow.keras import layers, models
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
@@ -5,7 +17,19 @@ from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.optimizers import Adam
 import matplotlib.pyplot as plt
 import numpy as np
-import os
+import argparse
+
+try:
+    from checkpointing import ResumableCheckpoint, TrainingState, load_best_weights
+except ImportError:
+    from app.ml_model.checkpointing import ResumableCheckpoint, TrainingState, load_best_weights
+
+try:
+    from config import Config
+except ImportError:
+    # Run as a script (python app/ml_model/train_model.py): config.py lives in the project root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from config import Config
 
 class WasteClassificationModel:
     def __init__(self, image_size=(224, 224), num_classes=6):
@@ -14,11 +38,11 @@ class WasteClassificationModel:
         self.model = None
         self.history = None
     
-    def build_model(self):
+    def build_model(self, weights='imagenet'):
         """Build the CNN model using transfer learning"""
         # Load pre-trained MobileNetV2
         base_model = MobileNetV2(
-            weights='imagenet',
+            weights=weights,
             include_top=False,
             input_shape=(*self.image_size, 3)
         )
@@ -32,18 +56,20 @@ class WasteClassificationModel:
             layers.GlobalAveragePooling2D(),
             layers.Dense(128, activation='relu'),
             layers.Dropout(0.3),
-            layers.Dense(self.num_classes, activation='softmax')
+            # float32 softmax keeps the output stable under mixed precision
+            layers.Dense(self.num_classes, activation='softmax', dtype='float32')
         ])
         
         self.model = model
         return model
     
-    def compile_model(self, learning_rate=0.001):
-        """Compile the model"""
+    def compile_model(self, learning_rate=0.001, jit_compile=False):
+        """Compile the model, optionally with XLA"""
         self.model.compile(
             optimizer=Adam(learning_rate=learning_rate),
             loss='categorical_crossentropy',
-            metrics=['accuracy']
+            metrics=['accuracy'],
+            jit_compile=jit_compile
         )
     
     def train(self, train_dir, val_dir, epochs=20, batch_size=32):
@@ -88,11 +114,99 @@ class WasteClassificationModel:
         
         return self.history
     
+    def unfreeze_top_blocks(self, blocks=3):
+        """Make the last ``blocks`` MobileNetV2 blocks (and the final 1x1 conv) trainable
+        
+        BatchNormalization layers stay frozen so the ImageNet statistics are kept.
+        Recompile afterwards, with a low learning rate.
+        """
+        base_model = self.model.layers[0]
+        base_model.trainable = True
+        first_block = f'block_{17 - blocks}_'
+        trainable = False
+        for layer in base_model.layers:
+            if layer.name.startswith(first_block):
+                trainable = True
+            layer.trainable = trainable and not isinstance(layer, layers.BatchNormalization)
+    
+    def feature_extractor(self):
+        """The frozen MobileNetV2 backbone plus pooling, i.e. everything below the head"""
+        return models.Sequential(self.model.layers[:2])
+    
+    def head_model(self):
+        """The trainable Dense/Dropout/Dense head as a model over pooled feature vectors
+        
+        It shares its layers with self.model, so training it updates the full model in place.
+        """
+        feature_dim = int(self.model.layers[0].output.shape[-1])
+        return models.Sequential([layers.Input(shape=(feature_dim,)), *self.model.layers[2:]])
+    
+    def extract_features(self, loader, paths, cache, variants=1, batch_size=32, seed=42):
+        """Backbone features of ``paths`` for ``variants`` augmentation passes, cached on disk
+        
+        Variant 0 is the plain image, variant v > 0 a seeded random augmentation.
+        Returns an array of shape (variants * len(paths), feature_dim).
+        """
+        extractor = self.feature_extractor()
+        backbone = self.model.layers[0].name + ('+enhance' if loader.enhance else '')
+        policy = tf.keras.mixed_precision.global_policy().name
+        if policy != 'float32':
+            backbone += f'+{policy}'
+        key = cache.config_key(self.image_size, backbone, seed)
+        features = []
+        for variant in range(variants):
+            augment_seed = None if variant == 0 else seed + variant
+            # Only images without a cached entry go through the backbone
+            features.append(cache.get_or_compute(paths, key, variant, lambda missing: extractor.predict(
+                loader.image_batches(missing, batch_size, augment_seed=augment_seed), verbose=0)))
+            print(f"  features variant {variant}: {features[-1].shape}")
+        return np.concatenate(features)
+    
+    def train_on_features(self, train_features, train_labels, val_features, val_labels,
+                          epochs=30, batch_size=64, learning_rate=0.001, jit_compile=False, callbacks=None):
+        """Train only the head on cached backbone features"""
+        head = self.head_model()
+        head.compile(
+            optimizer=Adam(learning_rate=learning_rate),
+            loss='categorical_crossentropy',
+            metrics=['accuracy'],
+            jit_compile=jit_compile
+        )
+        self.history = head.fit(
+            train_features, train_labels,
+            validation_data=(val_features, val_labels),
+            epochs=epochs,
+            batch_size=batch_size,
+            shuffle=True,
+            callbacks=callbacks,
+            verbose=1
+        )
+        return self.history
+    
     def save_model(self, filepath):
-        """Save the trained model"""
-        self.model.save(filepath)
+        """Save the trained model (always as float32, which is what the web app serves)"""
+        model = self.model
+        if tf.keras.mixed_precision.global_policy().name != 'float32':
+            model = self.float32_copy()
+        # Written next to the target and renamed, so the web app never loads a partial file
+        root, ext = os.path.splitext(filepath)
+        tmp_path = f"{root}.tmp-{os.getpid()}{ext}"
+        model.save(tmp_path)
+        os.replace(tmp_path, filepath)
         print(f"Model saved to {filepath}")
     
+    def float32_copy(self):
+        """The same network and weights built under the float32 policy"""
+        policy = tf.keras.mixed_precision.global_policy()
+        tf.keras.mixed_precision.set_global_policy('float32')
+        try:
+            copy = WasteClassificationModel(self.image_size, self.num_classes).build_model(weights=None)
+        finally:
+            tf.keras.mixed_precision.set_global_policy(policy)
+        # Mixed precision keeps float32 master weights, so this is exact
+        copy.set_weights(self.model.get_weights())
+        return copy
+    
     def plot_training_history(self):
         """Plot training history"""
         if self.history is None:
@@ -120,13 +234,107 @@ class WasteClassificationModel:
         plt.tight_layout()
         plt.show()
 
-def main():
+def train_head_from_feature_cache(model, loader, variants, epochs, cache_dir='feature_cache', jit_compile=False):
+    """Run the frozen backbone once per (image, augmentation variant), then train the head on the cached features"""
+    try:
+        from feature_cache import FeatureCache
+    except ImportError:
+        from app.ml_model.feature_cache import FeatureCache
+    cache = FeatureCache(cache_dir)
+    (train_paths, train_labels), (val_paths, val_labels) = loader.list_files(validation_split=0.2)
+    one_hot = np.eye(len(loader.classes), dtype=np.float32)
+    
+    print(f"Extracting training features ({variants} variants)...")
+    train_features = model.extract_features(loader, train_paths, cache, variants=variants)
+    print("Extracting validation features...")
+    val_features = model.extract_features(loader, val_paths, cache, variants=1)
+    
+    print("Training classification head on cached features...")
+    return model.train_on_features(
+        train_features, np.tile(one_hot[train_labels], (variants, 1)),
+        val_features, one_hot[val_labels],
+        epochs=epochs,
+        jit_compile=jit_compile,
+        callbacks=[throughput_callback(len(train_features), batch_size=64)]
+    )
+
+def train_phase(model, state, phase, make_datasets, epochs, steps_per_epoch, args, callbacks=()):
+    """Train one phase for up to ``epochs`` epochs, continuing from its last checkpoint
+    
+    ``make_datasets(skip_batches)`` returns (train, val) with the endless training
+    stream positioned after ``skip_batches`` batches. Stops early when val_loss
+    stops improving and ends with the phase's best weights loaded.
+    """
+    position = state.position(phase)
+    if position is None:
+        # Finished before the restart; continue from its best weights
+        load_best_weights(model.model, state, phase)
+        return
+    if epochs <= 0:
+        return
+    state.start_phase(phase)
+    
+    early_stopping = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=args.patience)
+    reduce_lr = tf.keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.2,
+                                                     patience=args.lr_patience, min_lr=1e-6)
+    checkpoint = ResumableCheckpoint(state, phase, steps_per_epoch, args.checkpoint_every,
+                                     tracked=(early_stopping, reduce_lr))
+    checkpoint.restore(model.model)
+    
+    epoch, step = position
+    while epoch < epochs and not early_stopping.stopped_epoch:
+        # An interrupted epoch is finished on its own, with only its remaining steps
+        last_epoch = epoch + 1 if step else epochs
+        train_ds, val_ds = make_datasets(epoch * steps_per_epoch + step)
+        model.history = model.model.fit(
+            train_ds,
+            epochs=last_epoch,
+            initial_epoch=epoch,
+            steps_per_epoch=steps_per_epoch - step,
+            validation_data=val_ds,
+            callbacks=[*callbacks, early_stopping, reduce_lr, checkpoint],
+            verbose=1
+        )
+        epoch, step = last_epoch, 0
+    
+    load_best_weights(model.model, state, phase)
+    state.finish_phase(phase)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the waste classification model")
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--feature-cache', action='store_true',
+                        help="Train only the head on cached frozen-backbone features")
+    parser.add_argument('--feature-variants', type=int, default=5,
+                        help="Augmentation variants per training image in --feature-cache mode (1 = none)")
+    parser.add_argument('--enhance', action='store_true', default=Config.ENHANCE_TRAINING_IMAGES,
+                        help="Apply the CLAHE + blur enhancement stage to training images")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue from the checkpoints in --checkpoint-dir instead of starting over")
+    parser.add_argument('--checkpoint-dir', default='checkpoints')
+    parser.add_argument('--checkpoint-every', type=int, default=200,
+                        help="Also checkpoint every N training steps (0: only at epoch ends)")
+    parser.add_argument('--patience', type=int, default=5, help="Early stopping patience on val_loss, in epochs")
+    parser.add_argument('--lr-patience', type=int, default=2,
+                        help="Epochs without val_loss improvement before the learning rate is reduced")
+    parser.add_argument('--finetune-epochs', type=int, default=5,
+                        help="Budget of the fine-tuning phase (0 disables it)")
+    parser.add_argument('--finetune-blocks', type=int, default=3,
+                        help="Number of top MobileNetV2 blocks unfrozen for fine-tuning")
+    parser.add_argument('--finetune-lr', type=float, default=1e-5)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    # Threads and precision must be set before the model is built
+    profile = CpuTrainingProfile.from_args(args)
+    profile.apply()
+    
     # Initialize model
     model = WasteClassificationModel()
     
     # Build and compile model
     model.build_model()
-    model.compile_model()
+    model.compile_model(jit_compile=profile.jit_compile)
     
     # Print model summary
     model.model.summary()
@@ -138,23 +346,58 @@ def main():
         print("Dataset found! Starting training...")
         
         # Use the dataset loader
-        from dataset_loader import TrashNetLoader
-        loader = TrashNetLoader(dataset_dir)
+        try:
+            from dataset_loader import TrashNetLoader
+        except ImportError:
+            from app.ml_model.dataset_loader import TrashNetLoader
+        loader = TrashNetLoader(dataset_dir, enhance=args.enhance)
         
         # Analyze dataset
         loader.analyze_dataset()
         
-        # Load dataset generators
-        train_gen, val_gen = loader.load_dataset(validation_split=0.2, batch_size=16)
+        if args.feature_cache:
+            train_head_from_feature_cache(model, loader, args.feature_variants, args.epochs,
+                                          jit_compile=profile.jit_compile)
+            model.save_model('app/ml_model/saved_model.h5')
+            print("Model training completed and saved!")
+            return
+        
+        # Prefer pre-decoded shards (python -m app.ml_model.dataset_shards), else decode the JPEGs
+        batch_size = 16
+        shard_dir = 'dataset_shards'
+        use_shards = os.path.exists(os.path.join(shard_dir, 'index.json'))
+        train_samples = len(loader.list_files(validation_split=0.2)[0][0])
+        steps_per_epoch = -(-train_samples // batch_size)
+        
+        def make_datasets(skip_batches):
+            if use_shards:
+                train_ds, val_ds = loader.load_shard_dataset(shard_dir, validation_split=0.2, batch_size=batch_size,
+                                                             repeat=True, skip_batches=skip_batches)
+            else:
+                # Load tf.data pipelines (parallel decode, cached, batched augmentation)
+                train_ds, val_ds = loader.load_tf_dataset(validation_split=0.2, batch_size=batch_size,
+                                                          repeat=True, skip_batches=skip_batches)
+            return train_ds.with_options(profile.dataset_options()), val_ds.with_options(profile.dataset_options())
+        
+        # Resuming is refused if the data or model setup changed since the checkpoints were written
+        state = TrainingState(args.checkpoint_dir, resume=args.resume, run={
+            'data': 'shards' if use_shards else 'files',
+            'train_samples': train_samples,
+            'batch_size': batch_size,
+            'enhance': args.enhance,
+            'finetune_blocks': args.finetune_blocks
+        })
+        throughput = throughput_callback(train_samples, batch_size)
         
-        # Train the model with fewer epochs for faster training
         print("Starting model training...")
-        history = model.model.fit(
-            train_gen,
-            epochs=10,  # Reduced epochs for faster training
-            validation_data=val_gen,
-            verbose=1
-        )
+        train_phase(model, state, 'head', make_datasets, args.epochs, steps_per_epoch, args, [throughput])
+        
+        if args.finetune_epochs > 0:
+            print(f"Fine-tuning the top {args.finetune_blocks} MobileNetV2 blocks...")
+            model.unfreeze_top_blocks(args.finetune_blocks)
+            model.compile_model(learning_rate=args.finetune_lr, jit_compile=profile.jit_compile)
+            train_phase(model, state, 'finetune', make_datasets, args.finetune_epochs, steps_per_epoch, args,
+                        [throughput])
         
         # Save the model
         model.save_model('app/ml_model/saved_model.h5')
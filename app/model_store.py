@@ -0,0 +1,199 @@
+"""Versioned model storage for zero-downtime rollouts.
+
+Every published model gets its own directory, and a manifest says which
+version serves traffic and, optionally, which candidate gets a share of it:
+
+    <MODEL_STORE_DIR>/<version>/saved_model.h5   (plus any exported variants,
+                                                  same file names as Config.MODEL_VARIANTS)
+    <MODEL_STORE_DIR>/manifest.json              {"active": "<version>",
+                                                  "candidate": {"version": "<version>",
+                                                                "percent": 10, "mode": "canary"}}
+
+Web workers poll the manifest and hot-swap without a restart. In 'canary'
+mode the candidate answers ``percent`` of the requests; in 'shadow' mode it
+also sees ``percent`` of them, but only to be compared with the active model.
+
+Usage (from the project root):
+    python -m app.model_store publish --activate        # current MODEL_PATH + exported variants
+    python -m app.model_store candidate 20250101-120000-ab12cd34 --percent 10 [--shadow]
+    python -m app.model_store activate 20250101-120000-ab12cd34
+    python -m app.model_store candidate --clear
+    python -m app.model_store list
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from config import Config
+
+MANIFEST_FILE = 'manifest.json'
+CANDIDATE_MODES = ('canary', 'shadow')
+
+
+class ModelStore:
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+
+    def manifest(self):
+        """The current manifest, or None if nothing was published yet"""
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def signature(self):
+        """Cheap change marker for polling: (mtime, size) of the manifest"""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if not name.startswith('.') and os.path.isdir(os.path.join(self.root, name)))
+
+    def model_path(self, version, variant):
+        """Path of ``variant`` (a Config.MODEL_VARIANTS key) inside ``version``"""
+        filename = os.path.basename(Config.MODEL_VARIANTS.get(variant, Config.MODEL_PATH))
+        return os.path.join(self.root, version, filename)
+
+    def active_model(self, variant):
+        """(path, version) of ``variant`` in the active version, or None if none is active"""
+        manifest = self.manifest()
+        if manifest and manifest.get('active'):
+            return self.model_path(manifest['active'], variant), manifest['active']
+        return None
+
+    def publish(self, paths, version=None):
+        """Copy model files into a new version directory and return its name
+
+        The directory is filled under a temporary name and renamed into place,
+        so a worker never sees a half-copied version.
+        """
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            raise FileNotFoundError("No model files to publish")
+        if version is None:
+            version = f"{time.strftime('%Y%m%d-%H%M%S')}-{_file_sha1(paths[0])[:8]}"
+        target = os.path.join(self.root, version)
+        if os.path.exists(target):
+            raise ValueError(f"Version {version} already exists")
+        tmp_dir = os.path.join(self.root, f'.tmp-{version}-{os.getpid()}')
+        os.makedirs(tmp_dir)
+        try:
+            for path in paths:
+                shutil.copy2(path, os.path.join(tmp_dir, os.path.basename(path)))
+            os.rename(tmp_dir, target)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return version
+
+    def activate(self, version):
+        """Make ``version`` the one serving traffic; a candidate of that version is promoted"""
+        self._require(version)
+        manifest = self.manifest() or {}
+        manifest['active'] = version
+        if (manifest.get('candidate') or {}).get('version') == version:
+            manifest['candidate'] = None
+        self.write_manifest(manifest)
+
+    def set_candidate(self, version, percent, mode='canary'):
+        if mode not in CANDIDATE_MODES:
+            raise ValueError(f"Candidate mode must be one of {CANDIDATE_MODES}")
+        if not 0 <= percent <= 100:
+            raise ValueError("Candidate percent must be between 0 and 100")
+        self._require(version)
+        manifest = self.manifest() or {}
+        if not manifest.get('active'):
+            raise ValueError("Activate a version before adding a candidate")
+        manifest['candidate'] = {'version': version, 'percent': percent, 'mode': mode}
+        self.write_manifest(manifest)
+
+    def clear_candidate(self):
+        manifest = self.manifest() or {}
+        manifest['candidate'] = None
+        self.write_manifest(manifest)
+
+    def write_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _require(self, version):
+        if not os.path.isdir(os.path.join(self.root, version)):
+            raise ValueError(f"Unknown model version {version}; published: {', '.join(self.versions()) or 'none'}")
+
+
+def _file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publish and roll out model versions")
+    parser.add_argument('--store', default=Config.MODEL_STORE_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    publish = commands.add_parser('publish', help="Copy model files into a new version")
+    publish.add_argument('paths', nargs='*', help="Default: MODEL_PATH and the exported variants")
+    publish.add_argument('--name', help="Version name (default: timestamp + content hash)")
+    publish.add_argument('--activate', action='store_true')
+
+    activate = commands.add_parser('activate', help="Serve all traffic from a version")
+    activate.add_argument('version')
+
+    candidate = commands.add_parser('candidate', help="Route a share of traffic to a second version")
+    candidate.add_argument('version', nargs='?')
+    candidate.add_argument('--percent', type=float, default=10.0)
+    candidate.add_argument('--shadow', action='store_true',
+                           help="Only compare with the active model instead of answering requests")
+    candidate.add_argument('--clear', action='store_true')
+
+    commands.add_parser('list', help="Show published versions and the manifest")
+    args = parser.parse_args(argv)
+
+    store = ModelStore(args.store)
+    if args.command == 'publish':
+        paths = args.paths or list(dict.fromkeys(Config.MODEL_VARIANTS.values()))
+        version = store.publish(paths, args.name)
+        print(f"✅ Published {version}")
+        if args.activate:
+            store.activate(version)
+            print(f"✅ Activated {version}")
+    elif args.command == 'activate':
+        store.activate(args.version)
+        print(f"✅ Activated {args.version}")
+    elif args.command == 'candidate':
+        if args.clear:
+            store.clear_candidate()
+            print("✅ Candidate cleared")
+        elif not args.version:
+            parser.error("candidate needs a version or --clear")
+        else:
+            mode = 'shadow' if args.shadow else 'canary'
+            store.set_candidate(args.version, args.percent, mode)
+            print(f"✅ {args.version} gets {args.percent:g}% of requests ({mode})")
+    else:
+        manifest = store.manifest() or {}
+        candidate = manifest.get('candidate') or {}
+        for version in store.versions():
+            role = 'active' if version == manifest.get('active') else \
+                f"{candidate['mode']} {candidate['percent']:g}%" if version == candidate.get('version') else ''
+            print(f"{version}  {role}".rstrip())
+
+
+if __name__ == "__main__":
+    main()
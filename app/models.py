@@ -1,59 +1,532 @@
-import tensorflow as tf
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
-import cv2
 import os
+import random
+import threading
+import time
 from config import Config
+from app.ml_model.preprocess import ImagePreprocessor
+from app.batching import InferenceBatcher, DeadlineExceeded
+from app.cache import create_prediction_cache
+from app.backends import load_backend, model_version
+from app.inference_server import RemoteBackend
+from app.model_store import ModelStore
+from app.metrics import (registry, timed_stage, PREDICTIONS, CACHE_LOOKUPS,
+                         MODEL_INFO, MODEL_LOAD_SECONDS, BATCHER, SHADOW_PREDICTIONS)
+
+
+class LoadedModel:
+    """One model version with its runtime and (optionally) its own batcher
+
+    Requests keep a reference to the LoadedModel they started with, so a
+    version that is swapped out keeps answering them until they finish.
+    """
+    
+    def __init__(self, version, backend, batching=False):
+        self.version = version
+        self.backend = backend
+        self.batcher = None
+        if batching:
+            self.batcher = InferenceBatcher(
+                backend.predict,
+                max_batch_size=Config.BATCH_MAX_SIZE,
+                max_wait_ms=Config.BATCH_MAX_WAIT_MS
+            )
+    
+    @property
+    def name(self):
+        return getattr(self.backend, 'name', type(self.backend).__name__)
+    
+    def predict(self, batch, deadline=None):
+        return self.predict_versioned(batch, deadline=deadline)[0]
+    
+    def predict_versioned(self, batch, deadline=None):
+        """(probabilities, version that produced them)
+        
+        The shared inference server reports the version it actually ran, which
+        is newer than ``version`` until its hot swap has been noticed here. It
+        also gets the ``deadline``, so an expired request isn't sent to it.
+        """
+        if self.batcher is not None:
+            return self.batcher.predict(batch, deadline=deadline), self.version
+        if hasattr(self.backend, 'predict_versioned'):
+            probabilities, version = self.backend.predict_versioned(batch, deadline=deadline)
+            return probabilities, version or self.version
+        return self.backend.predict(batch), self.version
+    
+    def warmup(self):
+        """Trace the inference graph for the batch sizes we expect to serve"""
+        sizes = {1, Config.BATCH_MAX_SIZE if self.batcher is not None else 1}
+        for size in sorted(sizes):
+            self.backend.predict(np.zeros((size, *Config.IMAGE_SIZE, 3), dtype=np.float32))
+    
+    def retire(self):
+        """Called once no new requests are routed here; queued ones still complete"""
+        if self.batcher is not None:
+            self.batcher.close()
+
 
 class WasteClassifier:
+    """Model wrapper used by the web app
+    
+    Creating it is cheap: the runtime is imported, the model loaded and warmed up
+    by ``start_loading()`` on a background thread, and ``state`` tells whether
+    it is ready to serve.
+    
+    With a model store manifest a watcher thread keeps the loaded versions in
+    line with it: a new version is loaded and warmed up next to the active one
+    and swapped in with a single assignment. ``candidate`` is an optional
+    second version that gets a share of the traffic (canary) or only sees it
+    for comparison (shadow).
+    """
+    
     def __init__(self):
-        self.model = None
+        self.active = None
+        self.candidate = None
+        self.store = ModelStore(Config.MODEL_STORE_DIR)
+        self.reloads = 0
+        self._manifest_signature = None
+        # Backoff for a manifest whose versions failed to load
+        self._failed_signature = None
+        self._reload_failures = 0
+        self._retry_at = 0.0
+        self.preprocessor = ImagePreprocessor(
+            target_size=Config.IMAGE_SIZE,
+            fast_decode=Config.FAST_JPEG_DECODE,
+            num_workers=Config.PREPROCESS_WORKERS,
+            enhance=Config.ENHANCE_IMAGES
+        )
+        self.cache = create_prediction_cache(Config)
+        self.state = 'idle'
+        self.timings = {}
+        self.ready_event = threading.Event()
+        self._loader_pid = None
+        self._loader_lock = threading.Lock()
+    
+    @property
+    def model(self):
+        """Runtime of the active version (None until loaded)"""
+        active = self.active
+        return active.backend if active is not None else None
+    
+    @property
+    def model_version(self):
+        active = self.active
+        return active.version if active is not None else None
+    
+    @property
+    def batcher(self):
+        active = self.active
+        return active.batcher if active is not None else None
+    
+    def start_loading(self):
+        """Load and warm up the model in the background (once per process)"""
+        with self._loader_lock:
+            # Threads don't survive a fork, so a preloaded Gunicorn worker loads again
+            if self._loader_pid == os.getpid():
+                return
+            self._loader_pid = os.getpid()
+            self.state = 'loading'
+            self.ready_event.clear()
+        threading.Thread(target=self.load_and_warmup, name='model-loader', daemon=True).start()
+    
+    def load_and_warmup(self):
+        started = time.perf_counter()
         self.load_model()
+        self.timings['model_load_s'] = round(time.perf_counter() - started, 3)
+        MODEL_LOAD_SECONDS.set(self.timings['model_load_s'], phase='load')
+        
+        if self.active is None:
+            self.state = 'failed'
+            self.ready_event.set()
+        else:
+            started = time.perf_counter()
+            try:
+                self.warmup()
+            except Exception as e:
+                print(f"⚠️ Model warmup failed: {e}")
+            self.timings['warmup_s'] = round(time.perf_counter() - started, 3)
+            MODEL_LOAD_SECONDS.set(self.timings['warmup_s'], phase='warmup')
+            
+            self.state = 'ready'
+            self.ready_event.set()
+            print(f"✅ Model ready (load {self.timings['model_load_s']}s, warmup {self.timings['warmup_s']}s)")
+        
+        if Config.MODEL_RELOAD_INTERVAL > 0 and Config.INFERENCE_SERVER_SOCKET:
+            # The inference server owns the model and follows the manifest itself
+            threading.Thread(target=self.watch_inference_server, name='model-watcher', daemon=True).start()
+        elif Config.MODEL_RELOAD_INTERVAL > 0:
+            self.reload()
+            threading.Thread(target=self.watch_store, name='model-watcher', daemon=True).start()
+    
+    def warmup(self):
+        """Trace the inference graph for the batch sizes we expect to serve"""
+        self.active.warmup()
+    
+    def is_ready(self):
+        return self.state == 'ready'
     
     def load_model(self):
-        """Load the trained model"""
+        """Load the trained model with the runtime selected by Config.INFERENCE_BACKEND
+
+        The manifest's active version is used when the model store has one,
+        Config.MODEL_PATH / Config.MODEL_VARIANTS otherwise.
+        """
+        if Config.INFERENCE_SERVER_SOCKET:
+            self.connect_inference_server(Config.INFERENCE_SERVER_SOCKET)
+            return
+        
+        manifest = self.store.manifest()
+        if manifest and manifest.get('active'):
+            self.active = self.load_version(manifest['active'], warmup=False)
+            return
+        
+        variant = Config.INFERENCE_BACKEND
+        model_path = Config.MODEL_VARIANTS.get(variant, Config.MODEL_PATH)
         try:
-            if os.path.exists(Config.MODEL_PATH):
-                self.model = load_model(Config.MODEL_PATH)
-                print("✅ Model loaded successfully")
+            if os.path.exists(model_path):
+                backend = load_backend(variant, model_path, num_threads=Config.INFERENCE_THREADS)
+                self.active = LoadedModel(model_version(model_path), backend, batching=Config.BATCHING_ENABLED)
+                print(f"✅ Model loaded successfully ({variant})")
             else:
-                print("❌ Model file not found")
-                self.model = None
+                print(f"❌ Model file not found: {model_path}")
         except Exception as e:
             print(f"❌ Error loading model: {e}")
-            self.model = None
-    
-    def preprocess_image(self, img_path):
-        """Preprocess the image for model prediction"""
-        img = image.load_img(img_path, target_size=Config.IMAGE_SIZE)
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = preprocess_input(img_array)
-        return img_array
-    
-    def predict(self, img_path):
-        """Predict waste category from image"""
+    
+    def load_version(self, version, batching=None, warmup=True):
+        """Load (and warm up) a published version; None if it can't be loaded"""
+        variant = Config.INFERENCE_BACKEND
+        model_path = self.store.model_path(version, variant)
+        started = time.perf_counter()
+        try:
+            backend = load_backend(variant, model_path, num_threads=Config.INFERENCE_THREADS)
+            model = LoadedModel(version, backend,
+                                batching=Config.BATCHING_ENABLED if batching is None else batching)
+            if warmup:
+                model.warmup()
+        except Exception as e:
+            print(f"❌ Error loading model version {version}: {e}")
+            return None
+        print(f"✅ Model version {version} loaded ({variant}, {time.perf_counter() - started:.2f}s)")
+        return model
+    
+    def connect_inference_server(self, socket_path):
+        """Use the shared inference server instead of a model loaded in this process"""
         try:
-            if self.model is None:
-                return "Model not loaded", 0.0
+            backend = RemoteBackend(socket_path)
+            # The server batches across workers, so no batcher here
+            self.active = LoadedModel(backend.info['model_version'], backend)
+            print(f"✅ Connected to inference server at {socket_path} ({backend.info['backend']})")
+        except Exception as e:
+            print(f"❌ Error connecting to inference server: {e}")
+    
+    def watch_store(self):
+        """Poll the model store manifest and apply changes (runs on its own thread)"""
+        while True:
+            time.sleep(Config.MODEL_RELOAD_INTERVAL)
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"⚠️ Model reload failed: {e}")
+    
+    def watch_inference_server(self):
+        """Keep ``model_version`` in line with what the shared inference server serves"""
+        while True:
+            time.sleep(Config.MODEL_RELOAD_INTERVAL)
+            active = self.active
+            if active is None:
+                continue
+            try:
+                version = active.backend.refresh_info()['model_version']
+            except Exception as e:
+                print(f"⚠️ Could not query the inference server: {e}")
+                continue
+            self.follow_inference_server(active, version)
+    
+    def follow_inference_server(self, active, version):
+        """Report ``version`` from now on if the shared inference server switched to it"""
+        if version != active.version and self.active is active:
+            self.active = LoadedModel(version, active.backend)
+            self.reloads += 1
+            print(f"✅ Inference server switched to model version {version}")
+    
+    def reload(self):
+        """Bring the loaded versions in line with the manifest if it changed
+        
+        New versions are loaded and warmed up before they are swapped in, so
+        requests never wait for a load; if loading fails the current versions
+        keep serving and the load is retried with exponential backoff. Versions
+        no longer referenced are retired only after the swap, so requests
+        already holding them finish normally.
+        """
+        signature = self.store.signature()
+        if signature is None or signature == self._manifest_signature:
+            return
+        if signature == self._failed_signature and time.monotonic() < self._retry_at:
+            return
+        manifest = self.store.manifest() or {}
+        target = manifest.get('active')
+        if not target:
+            self._manifest_signature = signature
+            return
+        
+        candidate = self.candidate
+        loaded = {model.version: model for model in (self.active, candidate and candidate['model'])
+                  if model is not None}
+        
+        active = loaded.get(target) or self.load_version(target)
+        if active is None:
+            self._reload_failed(signature, target)
+            return
+        spec = manifest.get('candidate') or {}
+        new_candidate = None
+        failed = None
+        if spec.get('version') and spec['version'] != target:
+            # Candidates always get a batcher so shadow requests can be queued off the request thread
+            model = loaded.get(spec['version']) or self.load_version(spec['version'], batching=True)
+            if model is not None:
+                new_candidate = {'model': model, 'mode': spec.get('mode', 'canary'),
+                                 'percent': float(spec.get('percent', 0))}
+            else:
+                failed = spec['version']
+        
+        swapped = self.active is not active
+        self.active = active
+        self.candidate = new_candidate
+        if swapped:
+            self.reloads += 1
+            self.state = 'ready'
+            self.ready_event.set()
+            print(f"✅ Now serving model version {active.version}")
+        
+        keep = {active.version, new_candidate and new_candidate['model'].version}
+        for version, model in loaded.items():
+            if version not in keep:
+                model.retire()
+        
+        if failed is not None:
+            # The active version is applied; the candidate is tried again on a later poll
+            self._reload_failed(signature, failed)
+            return
+        self._manifest_signature = signature
+        self._failed_signature = None
+    
+    def _reload_failed(self, signature, version):
+        # A manifest edited since the last failure starts a fresh backoff
+        if signature != self._failed_signature:
+            self._failed_signature = signature
+            self._reload_failures = 0
+        self._reload_failures += 1
+        delay = min(300, max(1, Config.MODEL_RELOAD_INTERVAL) * 2 ** (self._reload_failures - 1))
+        self._retry_at = time.monotonic() + delay
+        serving = self.active.version if self.active is not None else None
+        print(f"⚠️ Model version {version} could not be loaded; still serving {serving}, retrying in {delay}s")
+    
+    def choose_model(self):
+        """The version that answers the next request: the active one or, for a canary share, the candidate"""
+        active, candidate = self.active, self.candidate
+        if (candidate is not None and candidate['mode'] == 'canary'
+                and random.random() * 100 < candidate['percent']):
+            return candidate['model']
+        return active
+    
+    def preprocess_image(self, img_source, enhance=None):
+        """Preprocess the image for model prediction
+        
+        ``img_source`` is either a file path or the raw bytes of an upload, in
+        which case the image is decoded straight from memory.
+        """
+        img = self.decode_image(img_source, enhance=enhance)
+        with timed_stage('preprocess'):
+            return self.preprocessor.to_batch([img])
+    
+    def decode_image(self, img_source, enhance=None):
+        """Decode and resize to an RGB uint8 (H, W, 3) array"""
+        with timed_stage('decode'):
+            return self.preprocessor.decode(img_source, enhance=enhance)
+    
+    def predict_batch(self, batch):
+        """Run the active model on an already batched array of preprocessed images"""
+        return self.model.predict(batch)
+    
+    def run_inference(self, batch, deadline=None, model=None):
+        """Return the raw class probabilities for a preprocessed batch
+        
+        ``model`` is the LoadedModel to use (default: the active one).
+        Raises DeadlineExceeded instead of running the model once the
+        time.perf_counter() ``deadline`` has passed.
+        """
+        return self.run_inference_versioned(batch, deadline=deadline, model=model)[0]
+    
+    def run_inference_versioned(self, batch, deadline=None, model=None):
+        """Like run_inference(), but returns (probabilities, version that produced them)
+        
+        With the shared inference server that is the version the server ran,
+        which is also adopted as the active version right away.
+        """
+        model = model or self.active
+        if deadline is not None and time.perf_counter() >= deadline:
+            raise DeadlineExceeded("Deadline exceeded before inference")
+        with timed_stage('inference'):
+            probabilities, version = model.predict_versioned(batch, deadline=deadline)
+        if model is self.active:
+            self.shadow(batch, probabilities)
+            self.follow_inference_server(model, version)
+        return probabilities, version
+    
+    def shadow(self, batch, probabilities):
+        """Send a share of the active model's batches to a shadow candidate and count top-1 agreement
+        
+        The candidate runs on its own batcher thread; the request doesn't wait for it.
+        """
+        candidate = self.candidate
+        if (candidate is None or candidate['mode'] != 'shadow'
+                or random.random() * 100 >= candidate['percent']):
+            return
+        batcher = candidate['model'].batcher
+        # Shed shadow work rather than let it queue up behind a slow candidate
+        if batcher.pending() >= Config.BATCH_MAX_SIZE * 4:
+            SHADOW_PREDICTIONS.inc(len(batch), result='skipped')
+            return
+        expected = np.argmax(probabilities, axis=1)
+        batcher.submit(batch).add_done_callback(lambda future: self._record_shadow(future, expected))
+    
+    @staticmethod
+    def _record_shadow(future, expected):
+        if future.exception() is not None:
+            SHADOW_PREDICTIONS.inc(len(expected), result='error')
+            return
+        agree = int(np.sum(np.argmax(future.result(), axis=1) == expected))
+        SHADOW_PREDICTIONS.inc(agree, result='agree')
+        SHADOW_PREDICTIONS.inc(len(expected) - agree, result='disagree')
+    
+    def classify_array(self, batch, deadline=None, model=None):
+        """Classify a preprocessed batch
+        
+        Returns one (category, confidence) per row and the model version that produced them.
+        """
+        probabilities, version = self.run_inference_versioned(batch, deadline=deadline, model=model)
+        return [self.decode_prediction(row) for row in probabilities], version
+    
+    @staticmethod
+    def decode_prediction(probabilities):
+        """Map one probability vector to (category, confidence)"""
+        predicted_class = int(np.argmax(probabilities))
+        return Config.WASTE_CATEGORIES[predicted_class], float(probabilities[predicted_class])
+    
+    def predict(self, img_source, enhance=None):
+        """Predict waste category from an image path or raw image bytes
+        
+        ``enhance`` turns the enhancement stage on or off for this image
+        (default: Config.ENHANCE_IMAGES).
+        """
+        result = self.predict_detailed(img_source, enhance=enhance)
+        return result['category'], result['confidence']
+    
+    def predict_detailed(self, img_source, enhance=None, deadline=None):
+        """Like predict(), but returns a dict that also holds the probability
+        vector, the model version that produced it, whether it came from the
+        cache, and the decoded uint8 image (None on cache hits) for callers
+        that want to reuse it.
+        
+        DeadlineExceeded propagates if ``deadline`` passes before inference.
+        """
+        result = {'category': "Unknown", 'confidence': 0.0, 'probabilities': None,
+                  'model_version': None, 'cached': False, 'decoded': None}
+        try:
+            # Picked once, so a swap mid-request doesn't mix versions
+            model = self.choose_model()
+            if model is None:
+                result['category'] = "Model not loaded"
+                return result
+            result['model_version'] = model.version
+            
+            # Identical uploads are answered from the cache without decoding
+            cache_key = None
+            if self.cache is not None and isinstance(img_source, (bytes, bytearray, memoryview)):
+                enhanced = self.preprocessor.enhance if enhance is None else enhance
+                cache_key = self.cache.make_key(img_source, f"{model.version}{'+enhance' if enhanced else ''}")
+                with timed_stage('cache'):
+                    cached = self.cache.get(cache_key)
+                CACHE_LOOKUPS.inc(result='miss' if cached is None else 'hit')
+                if cached is not None:
+                    PREDICTIONS.inc(category=cached['category'], source='cache', version=model.version)
+                    result.update(cached, cached=True)
+                    return result
             
             # Preprocess image
-            processed_img = self.preprocess_image(img_path)
+            decoded = self.decode_image(img_source, enhance=enhance)
+            with timed_stage('preprocess'):
+                processed_img = self.preprocessor.to_batch([decoded])
             
             # Make prediction
-            predictions = self.model.predict(processed_img, verbose=0)
-            predicted_class = np.argmax(predictions[0])
-            confidence = np.max(predictions[0])
+            probabilities, version = self.run_inference_versioned(processed_img, deadline=deadline, model=model)
+            probabilities = probabilities[0]
+            category, confidence = self.decode_prediction(probabilities)
+            PREDICTIONS.inc(category=category, source='model', version=version)
+            result['model_version'] = version
+            if cache_key is not None and version != model.version:
+                # Stored under the version that produced it (the shared server swapped models)
+                cache_key = self.cache.make_key(img_source, f"{version}{'+enhance' if enhanced else ''}")
             
-            category = Config.WASTE_CATEGORIES[predicted_class]
+            prediction = {
+                'category': category,
+                'confidence': confidence,
+                'probabilities': [float(p) for p in probabilities]
+            }
+            if cache_key is not None:
+                self.cache.set(cache_key, prediction)
             
-            return category, confidence
+            result.update(prediction, decoded=decoded)
+            return result
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Prediction error: {e}")
-            return "Unknown", 0.0
+            return result
+    
+    def stats(self):
+        """Return batching, cache and rollout statistics for tuning"""
+        batcher = self.batcher
+        if batcher is None:
+            stats = {'batching': False}
+        else:
+            stats = batcher.stats.snapshot()
+            stats['batching'] = True
+            stats['max_batch_size'] = batcher.max_batch_size
+            stats['max_wait_ms'] = batcher.max_wait * 1000
+        stats['state'] = self.state
+        stats['model_version'] = self.model_version
+        candidate = self.candidate
+        stats['candidate'] = None if candidate is None else {
+            'version': candidate['model'].version, 'mode': candidate['mode'], 'percent': candidate['percent']}
+        stats['reloads'] = self.reloads
+        stats['cache'] = self.cache.stats() if self.cache is not None else None
+        return stats
+
+    def collect_metrics(self):
+        """Copy the loaded models and the active batcher's state into /metrics gauges"""
+        active, candidate = self.active, self.candidate
+        MODEL_INFO.clear()
+        MODEL_INFO.set(1, version=self.model_version or '', backend=self.backend_name(),
+                       state=self.state, role='active')
+        if candidate is not None:
+            model = candidate['model']
+            MODEL_INFO.set(candidate['percent'] / 100, version=model.version, backend=model.name,
+                           state='ready', role=candidate['mode'])
+        if active is not None and active.batcher is not None:
+            stats = active.batcher.stats.snapshot()
+            BATCHER.set(stats['batches'], stat='batches')
+            BATCHER.set(stats['items'], stat='items')
+            BATCHER.set(stats['avg_batch_size'], stat='avg_batch_size')
+            BATCHER.set(stats['expired'], stat='expired')
+            for name, value in stats['queue_wait_ms'].items():
+                BATCHER.set(value / 1000, stat=f'queue_wait_{name}_seconds')
+    
+    def backend_name(self):
+        active = self.active
+        return active.name if active is not None else ''
 
 # Global model instance
-waste_classifier = WasteClassifier()
\ No newline at end of file
+waste_classifier = WasteClassifier()
+registry.add_collector(waste_classifier.collect_metrics)
\ No newline at end of file
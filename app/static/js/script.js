@@ -9,6 +9,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const resultImage = document.getElementById('result-image');
     const recyclingDescription = document.getElementById('recycling-description');
     const recyclingTips = document.getElementById('recycling-tips');
+    const cameraBtn = document.getElementById('camera-btn');
+    const cameraVideo = document.getElementById('camera-video');
     
     // Color mapping for categories
     const categoryColors = {
@@ -20,6 +22,240 @@ document.addEventListener('DOMContentLoaded', function() {
         'Organic/Trash': '#228B22'
     };
     
+    // Recycling info is fetched once per page; the browser revalidates it with its ETag
+    let recyclingInfoRequest = null;
+    function loadRecyclingInfo(url) {
+        if (!recyclingInfoRequest) {
+            recyclingInfoRequest = fetch(url).then(response => response.json()).catch(() => {
+                recyclingInfoRequest = null;
+                return {};
+            });
+        }
+        return recyclingInfoRequest;
+    }
+    let previewUrl = null;
+    
+    // Photos are resized to the model's input size before upload, so the server
+    // receives a few KB instead of a multi-megabyte original and skips its resize
+    const modelWidth = parseInt(uploadArea && uploadArea.dataset.imageWidth, 10) || 224;
+    const modelHeight = parseInt(uploadArea && uploadArea.dataset.imageHeight, 10) || 224;
+    const uploadQuality = parseFloat(uploadArea && uploadArea.dataset.uploadQuality) || 0.9;
+    const streamUrl = (uploadArea && uploadArea.dataset.streamUrl) || '/ws/classify';
+    const streamFps = parseFloat(uploadArea && uploadArea.dataset.streamFps) || 8;
+    const recyclingInfoUrl = (uploadArea && uploadArea.dataset.recyclingInfoUrl) || '/recycling-info';
+    
+    function createCanvas(width, height) {
+        const canvas = window.OffscreenCanvas
+            ? new OffscreenCanvas(width, height)
+            : Object.assign(document.createElement('canvas'), { width: width, height: height });
+        // Nearest-neighbour scaling, like the server's resize
+        canvas.getContext('2d').imageSmoothingEnabled = false;
+        return canvas;
+    }
+    
+    // EXIF orientation of a JPEG (1 = upright, also for non-JPEGs). Browsers rotate
+    // by it when decoding, the server and the training data do not.
+    async function exifOrientation(file) {
+        const view = new DataView(await file.slice(0, 128 * 1024).arrayBuffer());
+        if (view.byteLength < 4 || view.getUint16(0) !== 0xFFD8) return 1;
+        let offset = 2;
+        while (offset + 4 <= view.byteLength) {
+            const marker = view.getUint16(offset);
+            const length = view.getUint16(offset + 2);
+            if (marker === 0xFFE1 && offset + 10 <= view.byteLength && view.getUint32(offset + 4) === 0x45786966) {
+                const tiff = offset + 10;
+                const little = view.getUint16(tiff) === 0x4949;
+                const ifd = tiff + view.getUint32(tiff + 4, little);
+                if (ifd + 2 > view.byteLength) return 1;
+                const entries = view.getUint16(ifd, little);
+                for (let i = 0; i < entries; i++) {
+                    const entry = ifd + 2 + i * 12;
+                    if (entry + 10 > view.byteLength) return 1;
+                    if (view.getUint16(entry, little) === 0x0112) return view.getUint16(entry + 8, little);
+                }
+                return 1;
+            }
+            if ((marker & 0xFF00) !== 0xFF00 || marker === 0xFFDA) return 1;
+            offset += 2 + length;
+        }
+        return 1;
+    }
+    
+    // Browsers without a WebP encoder silently hand back PNG
+    async function encodeCompact(canvas) {
+        const blob = await encodeCanvas(canvas, 'image/webp');
+        if (blob && blob.type === 'image/webp') return blob;
+        return encodeCanvas(canvas, 'image/jpeg');
+    }
+    
+    function encodeCanvas(canvas, type) {
+        if (canvas.convertToBlob) {
+            return canvas.convertToBlob({ type: type, quality: uploadQuality });
+        }
+        return new Promise(resolve => canvas.toBlob(resolve, type, uploadQuality));
+    }
+    
+    // Resized to exactly IMAGE_SIZE so the server skips its own resize, stretched and
+    // nearest-neighbour like the server; the accuracy of this path at CLIENT_UPLOAD_QUALITY
+    // is measured by `evaluate --preprocessing client_resize`
+    async function downscaleImage(file) {
+        if (!window.createImageBitmap) return file;
+        // A rotated photo would reach the model upright from here but sideways from
+        // any other client, so those keep the server's path
+        if (await exifOrientation(file) !== 1) return file;
+        const bitmap = await createImageBitmap(file, {
+            resizeWidth: modelWidth,
+            resizeHeight: modelHeight,
+            resizeQuality: 'pixelated'
+        });
+        const canvas = createCanvas(modelWidth, modelHeight);
+        canvas.getContext('2d').drawImage(bitmap, 0, 0, modelWidth, modelHeight);
+        bitmap.close();
+        
+        const blob = await encodeCompact(canvas);
+        if (!blob || blob.size >= file.size) return file;
+        const extension = blob.type === 'image/webp' ? 'webp' : 'jpg';
+        return new File([blob], file.name.replace(/\.[^.]*$/, '') + '.' + extension, { type: blob.type });
+    }
+    
+    function showResult(data) {
+        if (categoryBadge) {
+            categoryBadge.textContent = data.category;
+            categoryBadge.style.backgroundColor = categoryColors[data.category] || '#777';
+        }
+        if (confidence) confidence.textContent = data.confidence + '% Confidence';
+    }
+    
+    function showRecyclingInfo(info) {
+        if (recyclingDescription && info) {
+            recyclingDescription.textContent = info.description || 'No description available.';
+        }
+        
+        // Update recycling tips
+        if (recyclingTips && info && info.tips) {
+            recyclingTips.innerHTML = '';
+            info.tips.forEach(tip => {
+                const li = document.createElement('li');
+                li.innerHTML = `<i class="fas fa-check-circle"></i> ${tip}`;
+                recyclingTips.appendChild(li);
+            });
+        }
+    }
+    
+    // Camera mode: frames are scaled to the model input and streamed over a
+    // WebSocket. At most a couple of frames are unanswered at any time and the
+    // server only classifies the newest one, so latency stays bounded when
+    // inference lags. Servers without WebSocket support get one POST at a time.
+    const maxUnansweredFrames = 2;
+    let camera = null;
+    
+    function connectStream(session) {
+        const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(protocol + '//' + location.host + streamUrl);
+        let opened = false;
+        session.sent = 0;
+        session.answered = 0;
+        socket.onopen = () => { opened = true; };
+        socket.onmessage = event => {
+            const data = JSON.parse(event.data);
+            session.answered = Math.max(session.answered, data.frame || 0);
+            if (data.type === 'prediction') showCameraResult(data);
+        };
+        socket.onclose = () => {
+            if (camera !== session) return;
+            if (opened) {
+                session.socket = null;
+                setTimeout(() => { if (camera === session) connectStream(session); }, 1000);
+            } else {
+                session.socket = null;
+                session.fallback = true;
+            }
+        };
+        session.socket = socket;
+    }
+    
+    async function sendFrame(session) {
+        if (session.busy || cameraVideo.readyState < 2) return;
+        const socket = session.socket;
+        if (socket && (socket.readyState !== WebSocket.OPEN || session.sent - session.answered >= maxUnansweredFrames)) return;
+        if (!socket && !session.fallback) return;
+        session.busy = true;
+        try {
+            session.canvas.getContext('2d').drawImage(cameraVideo, 0, 0, modelWidth, modelHeight);
+            const blob = await encodeCompact(session.canvas);
+            if (!blob || camera !== session) return;
+            if (socket) {
+                socket.send(blob);
+                session.sent += 1;
+            } else {
+                const formData = new FormData();
+                formData.append('file', blob, blob.type === 'image/webp' ? 'frame.webp' : 'frame.jpg');
+                const response = await fetch('/classify?image=none&recycling_info=ref', { method: 'POST', body: formData });
+                const data = await response.json();
+                if (!data.error) showCameraResult(data);
+            }
+        } catch (error) {
+            console.error('Camera frame error:', error);
+        } finally {
+            session.busy = false;
+        }
+    }
+    
+    function showCameraResult(data) {
+        if (!camera) return;
+        showResult(data);
+        // Recycling info only changes with the category
+        if (data.category !== camera.category) {
+            camera.category = data.category;
+            loadRecyclingInfo(recyclingInfoUrl).then(info => {
+                if (camera && camera.category === data.category) showRecyclingInfo(info[data.category] || {});
+            });
+        }
+    }
+    
+    async function startCamera() {
+        const stream = await navigator.mediaDevices.getUserMedia({ video: { facingMode: 'environment' }, audio: false });
+        cameraVideo.srcObject = stream;
+        cameraVideo.style.display = 'block';
+        if (resultImage) resultImage.style.display = 'none';
+        if (resultsSection) resultsSection.style.display = 'block';
+        camera = { stream: stream, canvas: createCanvas(modelWidth, modelHeight), socket: null, fallback: false, busy: false };
+        connectStream(camera);
+        camera.timer = setInterval(() => sendFrame(camera), 1000 / streamFps);
+        cameraBtn.innerHTML = '<i class="fas fa-stop"></i> Stop Camera';
+    }
+    
+    function stopCamera() {
+        if (!camera) return;
+        const session = camera;
+        camera = null;
+        clearInterval(session.timer);
+        if (session.socket) session.socket.close();
+        session.stream.getTracks().forEach(track => track.stop());
+        cameraVideo.srcObject = null;
+        cameraVideo.style.display = 'none';
+        if (resultImage) resultImage.style.display = '';
+        cameraBtn.innerHTML = '<i class="fas fa-video"></i> Use Camera';
+    }
+    
+    if (cameraBtn) {
+        if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
+            cameraBtn.style.display = 'none';
+        }
+        cameraBtn.addEventListener('click', function(e) {
+            e.stopPropagation();
+            if (camera) {
+                stopCamera();
+                return;
+            }
+            startCamera().catch(error => {
+                console.error('Camera error:', error);
+                stopCamera();
+                alert('Could not access the camera.');
+            });
+        });
+    }
+    
     // Upload area click event
     if (uploadArea) {
         uploadArea.addEventListener('click', function() {
@@ -46,19 +282,34 @@ document.addEventListener('DOMContentLoaded', function() {
                     return;
                 }
                 
+                stopCamera();
+                
                 // Show loading animation
                 loading.style.display = 'block';
                 if (resultsSection) resultsSection.style.display = 'none';
                 
-                // Create FormData and send to server
-                const formData = new FormData();
-                formData.append('file', file);
-                
-                fetch('/classify', {
-                    method: 'POST',
-                    body: formData
+                // Resize in the browser, falling back to the original file
+                downscaleImage(file)
+                .catch(() => file)
+                .then(upload => {
+                    // Create FormData and send to server
+                    const formData = new FormData();
+                    formData.append('file', upload);
+                    
+                    // The browser already has the image, so ask for a lean response
+                    return fetch('/classify?image=none&recycling_info=ref', {
+                        method: 'POST',
+                        body: formData
+                    });
                 })
                 .then(response => response.json())
+                .then(data => {
+                    if (data.error || !data.recycling_info_url) return data;
+                    return loadRecyclingInfo(data.recycling_info_url).then(info => {
+                        data.recycling_info = info[data.category] || {};
+                        return data;
+                    });
+                })
                 .then(data => {
                     // Hide loading animation
                     loading.style.display = 'none';
@@ -71,26 +322,17 @@ document.addEventListener('DOMContentLoaded', function() {
                     }
                     
                     // Update results section with received data
-                    if (categoryBadge) {
-                        categoryBadge.textContent = data.category;
-                        categoryBadge.style.backgroundColor = categoryColors[data.category] || '#777';
-                    }
-                    
-                    if (confidence) confidence.textContent = data.confidence + '% Confidence';
-                    if (resultImage) resultImage.src = 'data:image/jpeg;base64,' + data.image;
-                    if (recyclingDescription && data.recycling_info) {
-                        recyclingDescription.textContent = data.recycling_info.description || 'No description available.';
-                    }
-                    
-                    // Update recycling tips
-                    if (recyclingTips && data.recycling_info && data.recycling_info.tips) {
-                        recyclingTips.innerHTML = '';
-                        data.recycling_info.tips.forEach(tip => {
-                            const li = document.createElement('li');
-                            li.innerHTML = `<i class="fas fa-check-circle"></i> ${tip}`;
-                            recyclingTips.appendChild(li);
-                        });
+                    showResult(data);
+                    if (resultImage) {
+                        if (data.image) {
+                            resultImage.src = 'data:image/jpeg;base64,' + data.image;
+                        } else {
+                            if (previewUrl) URL.revokeObjectURL(previewUrl);
+                            previewUrl = URL.createObjectURL(file);
+                            resultImage.src = previewUrl;
+                        }
                     }
+                    showRecyclingInfo(data.recycling_info);
                     
                     // Show results section with animation
                     if (resultsSection) resultsSection.style.display = 'block';
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import time
+from collections import deque
+import numpy as np
+from app.metrics import timed_stage, STREAM_FRAMES, STREAM_CONNECTIONS
+
+
+def frame_signature(img, size=16):
+    """Block-averaged size x size grayscale thumbnail of an RGB uint8 array"""
+    height, width = img.shape[0] // size * size, img.shape[1] // size * size
+    gray = img[:height, :width].mean(axis=2, dtype=np.float32)
+    return gray.reshape(size, height // size, size, width // size).mean(axis=(1, 3))
+
+
+class CameraSession:
+    """Classification state of one camera stream
+
+    Frames of a session are processed one at a time, so no locking is needed.
+    """
+
+    def __init__(self, classifier, duplicate_threshold=3.0, smoothing_window=5):
+        self.classifier = classifier
+        self.duplicate_threshold = duplicate_threshold
+        self.window = deque(maxlen=max(1, smoothing_window))
+        self.signature = None
+        self.model_version = None
+
+    def process(self, data):
+        """Classify one encoded frame and return the message to send back"""
+        if not self.classifier.is_ready():
+            STREAM_FRAMES.inc(outcome='not_ready')
+            return {'type': 'status', 'status': self.classifier.state}
+        try:
+            decoded = self.classifier.decode_image(data)
+        except Exception:
+            STREAM_FRAMES.inc(outcome='error')
+            return {'type': 'error', 'error': 'Could not decode frame'}
+
+        # Compared with the last classified frame, so slow drift still adds up to a change
+        signature = frame_signature(decoded)
+        duplicate = (self.signature is not None and
+                     float(np.mean(np.abs(signature - self.signature))) < self.duplicate_threshold)
+        if duplicate:
+            STREAM_FRAMES.inc(outcome='duplicate')
+        else:
+            model = self.classifier.choose_model()
+            try:
+                with timed_stage('preprocess'):
+                    batch = self.classifier.preprocessor.to_batch([decoded])
+                probabilities, version = self.classifier.run_inference_versioned(batch, model=model)
+                probabilities = probabilities[0]
+            except Exception as e:
+                STREAM_FRAMES.inc(outcome='error')
+                return {'type': 'error', 'error': f'Processing error: {str(e)}'}
+            STREAM_FRAMES.inc(outcome='classified')
+            self.signature = signature
+            self.window.append(probabilities)
+            self.model_version = version
+
+        category, confidence = self.classifier.decode_prediction(np.mean(self.window, axis=0))
+        return {
+            'type': 'prediction',
+            'category': category,
+            'confidence': round(confidence * 100, 2),
+            'model_version': self.model_version,
+            'duplicate': duplicate
+        }
+
+
+class _LatestFrame:
+    __slots__ = ('frame', 'received_at', 'sequence', 'dropped')
+
+    def __init__(self):
+        self.frame = None
+        self.received_at = 0.0
+        self.sequence = 0
+        self.dropped = 0
+
+
+class CameraStream:
+    """ASGI WebSocket endpoint classifying a live camera feed
+
+    The client sends each frame as a binary message (a small JPEG/WebP). The
+    server keeps only the newest frame that is waiting, so when inference
+    falls behind, stale frames are dropped instead of queueing up, and
+    answers every classified frame with a JSON message carrying ``frame``,
+    the number of the frame it answers (counted from 1 per connection).
+    """
+
+    def __init__(self, classifier, max_connections=16, max_frame_bytes=512 * 1024,
+                 duplicate_threshold=3.0, smoothing_window=5):
+        self.classifier = classifier
+        self.max_connections = max_connections
+        self.max_frame_bytes = max_frame_bytes
+        self.duplicate_threshold = duplicate_threshold
+        self.smoothing_window = smoothing_window
+        self.connections = 0
+
+    async def __call__(self, scope, receive, send, run):
+        """Handle one connection; ``run(fn, *args)`` runs blocking work on the server's pool"""
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        if self.connections >= self.max_connections:
+            # Closing before accepting rejects the handshake
+            await send({'type': 'websocket.close', 'code': 1013})
+            return
+        self.classifier.start_loading()
+        await send({'type': 'websocket.accept'})
+
+        self.connections += 1
+        STREAM_CONNECTIONS.set(self.connections)
+        session = CameraSession(self.classifier, self.duplicate_threshold, self.smoothing_window)
+        latest = _LatestFrame()
+        ready = asyncio.Event()
+        worker = asyncio.create_task(self.classify_latest(session, latest, ready, send, run))
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect' or worker.done():
+                    break
+                data = message.get('bytes')
+                if data is None:
+                    continue
+                if len(data) > self.max_frame_bytes:
+                    worker.cancel()
+                    await send({'type': 'websocket.close', 'code': 1009})
+                    break
+                latest.sequence += 1
+                if latest.frame is not None:
+                    latest.dropped += 1
+                    STREAM_FRAMES.inc(outcome='dropped')
+                latest.frame = data
+                latest.received_at = time.perf_counter()
+                ready.set()
+        finally:
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+            self.connections -= 1
+            STREAM_CONNECTIONS.set(self.connections)
+
+    async def classify_latest(self, session, latest, ready, send, run):
+        try:
+            while True:
+                await ready.wait()
+                ready.clear()
+                data, sequence, received_at = latest.frame, latest.sequence, latest.received_at
+                latest.frame = None
+                result = await run(session.process, data)
+                result['frame'] = sequence
+                result['dropped'] = latest.dropped
+                result['latency_ms'] = round((time.perf_counter() - received_at) * 1000, 1)
+                await send({'type': 'websocket.send', 'text': json.dumps(result)})
+        except Exception as e:
+            # No frame would be answered any more, so end the stream instead of leaving the client waiting
+            print(f"⚠️ Camera stream worker failed: {e}")
+            try:
+                await send({'type': 'websocket.close', 'code': 1011})
+            except Exception:
+                pass
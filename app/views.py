@@ -1,69 +1,493 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import (Blueprint, render_template, request, jsonify, Response, stream_with_context, g, url_for,
+                   make_response, current_app, abort)
+from functools import wraps
 import os
+import json
+import gzip
+import hashlib
+import math
+import time
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
 import base64
+import uuid
+from app import STARTUP_TIMINGS
 from app.models import waste_classifier
+from app.admission import AdmissionController, TokenBucketLimiter
+from app.assets import AssetStore
+from app.batching import DeadlineExceeded
+from app.ml_model.preprocess import ImagePreprocessor, encode_thumbnail
+from app.metrics import (registry, timed_stage, server_timing_header, REQUEST_DURATION,
+                         ADMISSION, ADMISSION_PENDING, ADMISSION_LIMITS)
 from config import Config
 
 main = Blueprint('main', __name__)
+batch_preprocessor = ImagePreprocessor(
+    target_size=Config.IMAGE_SIZE,
+    fast_decode=Config.FAST_JPEG_DECODE,
+    num_workers=Config.PREPROCESS_WORKERS,
+    enhance=Config.ENHANCE_IMAGES
+)
+admission = AdmissionController(Config.MAX_PENDING_REQUESTS)
+assets = AssetStore(Config.ASSETS_DIST_DIR)
+# template name -> (html, gzipped html, etag)
+rendered_pages = {}
+rate_limiter = TokenBucketLimiter(Config.RATE_LIMIT_PER_SECOND, Config.RATE_LIMIT_BURST)
+
+ADMISSION_LIMITS.set(Config.MAX_PENDING_REQUESTS, limit='max_pending_requests')
+ADMISSION_LIMITS.set(Config.RATE_LIMIT_PER_SECOND, limit='rate_limit_per_second')
+ADMISSION_LIMITS.set(Config.RATE_LIMIT_BURST, limit='rate_limit_burst')
+ADMISSION_LIMITS.set(Config.REQUEST_DEADLINE_MS / 1000, limit='request_deadline_seconds')
+registry.add_collector(lambda: ADMISSION_PENDING.set(admission.pending))
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
+@main.app_template_global()
+def asset_url(filename):
+    """Fingerprinted URL of a static file, or its plain /static URL if the assets weren't built"""
+    hashed = assets.hashed_name(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('main.asset', filename=hashed)
+
+def accepted_encodings():
+    return {encoding for encoding, quality in request.accept_encodings if quality > 0}
+
+def cached_page(template, status=200):
+    """Serve ``template`` rendered once per worker; repeat visits get 304 through its ETag
+    
+    The pages don't depend on the request, and asset URLs are fingerprinted,
+    so a deploy changes the ETag and browsers revalidate on every load.
+    """
+    page = rendered_pages.get(template)
+    if page is None:
+        html = render_template(template, config=Config).encode('utf-8')
+        page = (html, gzip.compress(html, mtime=0), hashlib.sha256(html).hexdigest()[:16])
+        if Config.PAGE_CACHE_ENABLED and not current_app.debug:
+            rendered_pages[template] = page
+    html, compressed, etag = page
+    
+    response = Response(html, status=status, mimetype='text/html')
+    if 'gzip' in accepted_encodings():
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = 'gzip'
+        # Each representation needs its own strong ETag, or a cache could serve gzip to anyone
+        etag += '-gz'
+    response.vary.add('Accept-Encoding')
+    if status != 200:
+        return response
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @main.route('/')
 def index():
     # Pass config to template
-    return render_template('index.html', config=Config)
+    return cached_page('index.html')
+
+@main.route('/assets/<path:filename>')
+def asset(filename):
+    """Fingerprinted asset from the build, precompressed if the client accepts it"""
+    found = assets.get(filename, accepted_encodings())
+    if found is None:
+        abort(404)
+    data, encoding, mimetype = found
+    response = Response(data, mimetype=mimetype)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # The name changes with the content, so the file can be cached for good
+    response.headers['Cache-Control'] = f'public, max-age={Config.ASSETS_MAX_AGE}, immutable'
+    return response
+
+def enhance_requested():
+    """Per-request override of the enhancement stage (`enhance=1|0`), None for the default"""
+    value = request.values.get('enhance')
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+def retry_response(message, status, retry_after):
+    """Error response telling the client when to try again"""
+    response = jsonify({'error': message})
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, status
+
+def model_unavailable():
+    """503 response while the model is still loading or warming up, else None"""
+    waste_classifier.start_loading()
+    if waste_classifier.state != 'loading':
+        return None
+    return retry_response('Model is warming up, please retry shortly', 503, 1)
+
+def client_id():
+    if Config.RATE_LIMIT_TRUST_FORWARDED and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or 'unknown'
+
+def request_deadline():
+    """time.perf_counter() by which inference must start, or None for no deadline"""
+    budget_ms = Config.REQUEST_DEADLINE_MS
+    requested = request.headers.get('X-Request-Deadline-Ms', type=float)
+    if requested is not None and requested > 0:
+        budget_ms = min(budget_ms, requested) if budget_ms else requested
+    if not budget_ms:
+        return None
+    return g.get('request_started', time.perf_counter()) + budget_ms / 1000
+
+def deadline_exceeded_response():
+    ADMISSION.inc(outcome='deadline_exceeded')
+    return retry_response('Request deadline exceeded, please retry', 503, Config.OVERLOAD_RETRY_AFTER)
+
+# Set in the WSGI environ by the ASGI adapter's early check; the slot is then released by the adapter
+EARLY_ADMISSION_KEY = 'greencity.admitted'
+
+def admit():
+    """Rate limit the current request and take an admission slot; an error response if turned away"""
+    allowed, wait = rate_limiter.allow(client_id())
+    if not allowed:
+        ADMISSION.inc(outcome='rate_limited')
+        return retry_response('Rate limit exceeded, please slow down', 429, wait)
+    if not admission.try_acquire():
+        ADMISSION.inc(outcome='overloaded')
+        return retry_response('Server is busy, please retry shortly', 503, Config.OVERLOAD_RETRY_AFTER)
+    ADMISSION.inc(outcome='admitted')
+    return None
+
+def admission_controlled(view):
+    """Rate limit a classification view and cap how many run at once
+    
+    Rejections happen before the upload is parsed. An admitted request keeps
+    its slot until its (possibly streamed) response is closed.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.environ.get(EARLY_ADMISSION_KEY):
+            # Admitted by the ASGI adapter before the body was received
+            g.deadline = request_deadline()
+            return view(*args, **kwargs)
+        rejected = admit()
+        if rejected is not None:
+            return rejected
+        g.deadline = request_deadline()
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            admission.release()
+            raise
+        response.call_on_close(admission.release)
+        return response
+    wrapper.admission_controlled = True
+    return wrapper
+
+def early_admission(app):
+    """Admission check for the ASGI adapter, run on the request line and headers only
+    
+    Returns ``check(environ) -> (rejection, release)``. A rejected client gets
+    its 429/503 before uploading the body; an admitted one holds its slot
+    until the adapter calls ``release()`` after the response is sent.
+    """
+    def check(environ):
+        try:
+            endpoint, _ = app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None, None
+        if not getattr(app.view_functions.get(endpoint), 'admission_controlled', False):
+            return None, None
+        with app.request_context(dict(environ)):
+            rejected = admit()
+            if rejected is not None:
+                return make_response(rejected), None
+        environ[EARLY_ADMISSION_KEY] = True
+        return None, admission.release
+    return check
+
+def upload_size(file):
+    """Size in bytes of an uploaded file without reading it"""
+    stream = file.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+IMAGE_MODES = ('full', 'thumbnail', 'none')
+RECYCLING_INFO_MODES = ('inline', 'ref')
+
+def response_modes():
+    """(image mode, recycling info mode) for this request, or raise ValueError"""
+    image_mode = request.values.get('image') or Config.RESPONSE_IMAGE_MODE
+    recycling_mode = request.values.get('recycling_info') or Config.RESPONSE_RECYCLING_INFO
+    if image_mode not in IMAGE_MODES:
+        raise ValueError(f"Invalid image mode, use one of: {', '.join(IMAGE_MODES)}")
+    if recycling_mode not in RECYCLING_INFO_MODES:
+        raise ValueError(f"Invalid recycling_info mode, use one of: {', '.join(RECYCLING_INFO_MODES)}")
+    return image_mode, recycling_mode
+
+def response_image(result, img_source, image_mode):
+    """Base64 image for the response: the upload itself, a thumbnail or None"""
+    if image_mode == 'none':
+        return None
+    if image_mode == 'full':
+        if isinstance(img_source, str):
+            with open(img_source, 'rb') as img_file:
+                img_source = img_file.read()
+        return base64.b64encode(img_source).decode('utf-8')
+    
+    # Reuse the array decoded for the model; cache hits have to decode again
+    decoded = result['decoded']
+    if decoded is None:
+        decoded = waste_classifier.decode_image(img_source)
+    with timed_stage('thumbnail'):
+        thumbnail = encode_thumbnail(decoded, Config.THUMBNAIL_SIZE, Config.THUMBNAIL_QUALITY)
+    return base64.b64encode(thumbnail).decode('utf-8')
+
+def classification_response(result, img_source, image_mode, recycling_mode):
+    category = result['category']
+    body = {
+        'success': True,
+        'category': category,
+        'confidence': round(float(result['confidence']) * 100, 2),
+        'model_version': result['model_version'],
+        'image_mode': image_mode
+    }
+    
+    # Get recycling info
+    if recycling_mode == 'inline':
+        body['recycling_info'] = Config.RECYCLING_INFO.get(category, {})
+    else:
+        body['recycling_info_url'] = url_for('main.recycling_info')
+    
+    image = response_image(result, img_source, image_mode)
+    if image is not None:
+        body['image'] = image
+    
+    with timed_stage('serialization'):
+        response = jsonify(body)
+    if result['model_version']:
+        response.headers['X-Model-Version'] = result['model_version']
+    return response
+
+def classify_in_memory(file, modes):
+    """Decode and classify the upload straight from the request buffer"""
+    try:
+        with timed_stage('upload'):
+            img_bytes = file.read()
+        result = waste_classifier.predict_detailed(img_bytes, enhance=enhance_requested(), deadline=g.get('deadline'))
+        return classification_response(result, img_bytes, *modes)
+    except DeadlineExceeded:
+        return deadline_exceeded_response()
+    except Exception as e:
+        return jsonify({'error': f'Processing error: {str(e)}'}), 500
+
+def classify_from_disk(file, modes):
+    """Fallback for large uploads: spool to UPLOAD_FOLDER and classify from there"""
+    # Unique prefix so concurrent uploads with the same name don't overwrite each other
+    filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+    filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
+    with timed_stage('upload'):
+        file.save(filepath)
+    
+    try:
+        # Get prediction
+        result = waste_classifier.predict_detailed(filepath, enhance=enhance_requested(), deadline=g.get('deadline'))
+        return classification_response(result, filepath, *modes)
+        
+    except DeadlineExceeded:
+        return deadline_exceeded_response()
+    except Exception as e:
+        return jsonify({'error': f'Processing error: {str(e)}'}), 500
+    finally:
+        # Clean up uploaded file
+        if os.path.exists(filepath):
+            os.remove(filepath)
 
 @main.route('/classify', methods=['POST'])
+@admission_controlled
 def classify_waste():
-    if 'file' not in request.files:
+    # Accessing request.files parses the multipart body
+    with timed_stage('upload'):
+        files = request.files
+    
+    if 'file' not in files:
         return jsonify({'error': 'No file uploaded'}), 400
     
-    file = request.files['file']
+    file = files['file']
     
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        try:
+            modes = response_modes()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        unavailable = model_unavailable()
+        if unavailable is not None:
+            return unavailable
         
+        if upload_size(file) <= Config.IN_MEMORY_UPLOAD_MAX_BYTES:
+            return classify_in_memory(file, modes)
+        return classify_from_disk(file, modes)
+    
+    return jsonify({'error': 'Invalid file type. Please upload PNG, JPG, or JPEG.'}), 400
+
+def classify_chunk(chunk, enhance=None, deadline=None):
+    """Classify one chunk of (index, filename, bytes) uploads, yielding one result dict per image"""
+    results = {}
+    decodable = []
+    for index, filename, data in chunk:
+        if not allowed_file(filename):
+            results[index] = {'error': 'Invalid file type'}
+        else:
+            decodable.append((index, data))
+    
+    errors = {}
+    with timed_stage('decode'):
+        batch, _ = batch_preprocessor.preprocess_batch(
+            [data for _, data in decodable], errors=errors, enhance=enhance
+        )
+    decoded = [index for position, (index, _) in enumerate(decodable) if position not in errors]
+    for position in errors:
+        results[decodable[position][0]] = {'error': 'Could not decode image'}
+    
+    if batch is not None:
+        # One version per chunk, so a hot swap never splits a forward pass
+        model = waste_classifier.choose_model()
         try:
-            # Get prediction
-            category, confidence = waste_classifier.predict(filepath)
-            
-            # Get recycling info
-            recycling_info = Config.RECYCLING_INFO.get(category, {})
-            
-            # Convert image to base64 for display
-            with open(filepath, "rb") as img_file:
-                img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-            
-            # Clean up uploaded file
-            os.remove(filepath)
-            
-            return jsonify({
-                'success': True,
-                'category': category,
-                'confidence': round(float(confidence) * 100, 2),
-                'recycling_info': recycling_info,
-                'image': img_base64
-            })
-            
+            predictions, version = waste_classifier.classify_array(batch, deadline=deadline, model=model)
+        except DeadlineExceeded:
+            predictions = None
+            ADMISSION.inc(outcome='deadline_exceeded')
+            for index in decoded:
+                results[index] = {'error': 'Request deadline exceeded'}
         except Exception as e:
-            # Clean up file in case of error
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            return jsonify({'error': f'Processing error: {str(e)}'}), 500
+            predictions = None
+            for index in decoded:
+                results[index] = {'error': f'Processing error: {str(e)}'}
+        if predictions is not None:
+            for index, (category, confidence) in zip(decoded, predictions):
+                results[index] = {
+                    'success': True,
+                    'category': category,
+                    'confidence': round(confidence * 100, 2),
+                    'model_version': version
+                }
     
-    return jsonify({'error': 'Invalid file type. Please upload PNG, JPG, or JPEG.'}), 400
+    for index, filename, _ in chunk:
+        result = results[index]
+        result.setdefault('success', False)
+        result['index'] = index
+        result['filename'] = filename
+        yield result
+
+@main.route('/classify/batch', methods=['POST'])
+@admission_controlled
+def classify_batch():
+    """Classify many uploads in one request, streaming results as NDJSON per chunk"""
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    
+    if not files:
+        return jsonify({'error': 'No files uploaded'}), 400
+    
+    if len(files) > Config.BATCH_ENDPOINT_MAX_FILES:
+        return jsonify({'error': f'Too many files (max {Config.BATCH_ENDPOINT_MAX_FILES})'}), 400
+    
+    unavailable = model_unavailable()
+    if unavailable is not None:
+        return unavailable
+    
+    if waste_classifier.model is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    
+    # Drain the multipart body up front; the generator then only does CPU work
+    uploads = [(index, f.filename, f.read()) for index, f in enumerate(files)]
+    chunk_size = max(1, Config.BATCH_ENDPOINT_CHUNK_SIZE)
+    enhance = enhance_requested()
+    deadline = g.get('deadline')
+    
+    def generate():
+        for start in range(0, len(uploads), chunk_size):
+            for result in classify_chunk(uploads[start:start + chunk_size], enhance=enhance, deadline=deadline):
+                yield json.dumps(result) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@main.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@main.after_app_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            endpoint=request.endpoint or 'unknown',
+            method=request.method,
+            status=response.status_code
+        )
+    timings = g.pop('server_timing', None)
+    if timings:
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+# Static payload, so its ETag is computed once
+RECYCLING_INFO_JSON = json.dumps(Config.RECYCLING_INFO, sort_keys=True)
+RECYCLING_INFO_ETAG = hashlib.sha256(RECYCLING_INFO_JSON.encode('utf-8')).hexdigest()[:16]
+
+@main.route('/recycling-info')
+def recycling_info():
+    """Recycling info for every category; clients revalidate with If-None-Match"""
+    response = Response(RECYCLING_INFO_JSON, mimetype='application/json')
+    response.set_etag(RECYCLING_INFO_ETAG)
+    response.cache_control.public = True
+    response.cache_control.max_age = Config.RECYCLING_INFO_MAX_AGE
+    return response.make_conditional(request)
+
+@main.route('/metrics')
+def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@main.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving HTTP"""
+    return jsonify({'status': 'ok', 'startup': STARTUP_TIMINGS})
+
+@main.route('/readyz')
+def readyz():
+    """Readiness: the model is loaded and warmed up"""
+    waste_classifier.start_loading()
+    body = {
+        'status': waste_classifier.state,
+        'model_version': waste_classifier.model_version,
+        'startup': dict(STARTUP_TIMINGS, **waste_classifier.timings)
+    }
+    return jsonify(body), 200 if waste_classifier.is_ready() else 503
+
+@main.route('/stats/inference')
+def inference_stats():
+    return jsonify(waste_classifier.stats())
 
 @main.route('/about')
 def about():
-    return render_template('about.html', config=Config)
+    return cached_page('about.html')
+
+@main.route('/favicon.ico')
+def favicon():
+    """Browsers ask for /favicon.ico on their own; send them to the fingerprinted copy"""
+    hashed = assets.hashed_name('favicon.ico')
+    if hashed is None:
+        return current_app.send_static_file('favicon.ico')
+    response = make_response('', 301)
+    response.headers['Location'] = url_for('main.asset', filename=hashed)
+    response.cache_control.public = True
+    response.cache_control.max_age = 24 * 3600
+    return response
 
 @main.route('/result')
 def result():
@@ -73,8 +497,8 @@ def result():
 
 @main.app_errorhandler(404)
 def not_found_error(error):
-    return render_template('404.html'), 404
+    return cached_page('404.html', 404)
 
 @main.app_errorhandler(500)
 def internal_error(error):
-    return render_template('404.html'), 500
\ No newline at end of file
+    return cached_page('404.html', 500)
\ No newline at end of file
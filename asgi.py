@@ -0,0 +1,24 @@
+from app import create_app
+from app.asgi import AsgiAdapter
+from app.models import waste_classifier
+from app.streaming import CameraStream
+from app.views import early_admission
+from config import Config
+
+flask_app = create_app()
+app = AsgiAdapter(
+    flask_app,
+    max_workers=Config.ASGI_WORKER_THREADS,
+    max_body_bytes=Config.MAX_CONTENT_LENGTH,
+    spool_bytes=Config.IN_MEMORY_UPLOAD_MAX_BYTES,
+    admission=early_admission(flask_app),
+    websocket_routes={
+        '/ws/classify': CameraStream(
+            waste_classifier,
+            max_connections=Config.STREAM_MAX_CONNECTIONS,
+            max_frame_bytes=Config.STREAM_MAX_FRAME_BYTES,
+            duplicate_threshold=Config.STREAM_DUPLICATE_THRESHOLD,
+            smoothing_window=Config.STREAM_SMOOTHING_WINDOW
+        )
+    }
+)
@@ -0,0 +1,346 @@
+"""Reproducible load test and latency benchmark for /classify.
+
+Drives the app in-process through the Flask test client (default) or a locally
+spawned server, with images sampled from dataset/ and configurable concurrency.
+Reports throughput and p50/p95/p99 latency end to end, per server-side stage
+(from the Server-Timing header) and per stage of an in-process pipeline run
+(upload, decode, preprocess, inference, serialization), and writes everything
+as JSON so runs can be compared.
+
+Usage (from the project root):
+    python benchmarks/classify_benchmark.py --requests 200 --concurrency 8
+    python benchmarks/classify_benchmark.py --spawn --concurrency 16 --output benchmarks/results/run.json
+    python benchmarks/classify_benchmark.py --compare benchmarks/results/base.json benchmarks/results/run.json
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STAGES = ('upload', 'decode', 'preprocess', 'inference', 'serialization')
+
+
+def sample_images(dataset_dir, count, seed):
+    paths = []
+    for class_name in sorted(os.listdir(dataset_dir)):
+        class_dir = os.path.join(dataset_dir, class_name)
+        if os.path.isdir(class_dir):
+            paths.extend(os.path.join(class_dir, f) for f in sorted(os.listdir(class_dir))
+                         if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+    rng = random.Random(seed)
+    return [rng.choice(paths) for _ in range(count)]
+
+
+def summarize(samples_ms, wall_time=None):
+    values = np.asarray(samples_ms, dtype=np.float64)
+    if not len(values):
+        return {'count': 0}
+    summary = {
+        'count': int(len(values)),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+    if wall_time:
+        summary['throughput_rps'] = round(len(values) / wall_time, 2)
+    return summary
+
+
+def encode_multipart(filename, data):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8') + data + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def run_concurrent(fn, items, concurrency):
+    """Call fn(item) for every item from ``concurrency`` threads; returns (results, wall time)"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fn, items))
+    return results, time.perf_counter() - started
+
+
+def parse_server_timing(header):
+    """{'stage': ms} from a Server-Timing header value"""
+    timings = {}
+    for entry in (header or '').split(','):
+        name, _, params = entry.strip().partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if name and key == 'dur':
+                timings[name] = float(value)
+    return timings
+
+
+def classified(status, body):
+    """Whether a /classify response is an actual classification, not an error answered with any status"""
+    try:
+        return status == 200 and json.loads(body).get('success') is True
+    except (ValueError, AttributeError):
+        return False
+
+
+def bench_end_to_end(post, images, concurrency, warmup):
+    """End-to-end /classify latency through ``post(filename, data) -> (status, success, Server-Timing)``
+
+    Only successful classifications count towards the latency percentiles and
+    throughput; everything else is reported under ``failures``. Also summarizes
+    the server-side stage timings reported in Server-Timing.
+    """
+    payloads = {path: open(path, 'rb').read() for path in set(images)}
+    for path in images[:warmup]:
+        post(os.path.basename(path), payloads[path])
+
+    def one(path):
+        started = time.perf_counter()
+        status, success, server_timing = post(os.path.basename(path), payloads[path])
+        return (time.perf_counter() - started) * 1000, status, success, parse_server_timing(server_timing)
+
+    results, wall = run_concurrent(one, images, concurrency)
+    statuses = {}
+    server_stages = {}
+    for _, status, success, timings in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if not success:
+            continue
+        for stage, value in timings.items():
+            server_stages.setdefault(stage, []).append(value)
+    summary = summarize([latency for latency, _, success, _ in results if success], wall)
+    summary['failures'] = sum(1 for _, _, success, _ in results if not success)
+    summary['status_codes'] = statuses
+    summary['server_stages'] = {stage: summarize(values) for stage, values in server_stages.items()}
+    return summary
+
+
+def bench_stages(images, concurrency):
+    """Per-stage latency of the in-process pipeline, run under the same concurrency"""
+    from werkzeug.test import EnvironBuilder
+    from werkzeug.wrappers import Request
+    from app.models import waste_classifier
+    from app.ml_model.preprocess import preprocess_input
+    from config import Config
+
+    payloads = {path: open(path, 'rb').read() for path in set(images)}
+    timings = {stage: [] for stage in STAGES}
+    lock = threading.Lock()
+
+    def one(path):
+        data = payloads[path]
+        marks = [time.perf_counter()]
+        # upload: multipart encoding and parsing of the request body
+        builder = EnvironBuilder(method='POST', data={'file': (io.BytesIO(data), os.path.basename(path))})
+        upload = Request(builder.get_environ()).files['file'].read()
+        marks.append(time.perf_counter())
+        img = waste_classifier.preprocessor.decode(upload)
+        marks.append(time.perf_counter())
+        batch = np.empty((1, *Config.IMAGE_SIZE, 3), dtype=np.float32)
+        batch[0] = img
+        preprocess_input(batch)
+        marks.append(time.perf_counter())
+        probabilities = waste_classifier.run_inference(batch)[0]
+        category, confidence = waste_classifier.decode_prediction(probabilities)
+        marks.append(time.perf_counter())
+        json.dumps({'success': True, 'category': category, 'confidence': round(confidence * 100, 2),
+                    'recycling_info': Config.RECYCLING_INFO.get(category, {}),
+                    'image': base64.b64encode(upload).decode('utf-8')})
+        marks.append(time.perf_counter())
+        with lock:
+            for stage, start, end in zip(STAGES, marks, marks[1:]):
+                timings[stage].append((end - start) * 1000)
+
+    run_concurrent(one, images, concurrency)
+    return {stage: summarize(values) for stage, values in timings.items()}
+
+
+def require_model():
+    """Load the model in this process and stop the run if it isn't usable"""
+    from app.models import waste_classifier
+    waste_classifier.start_loading()
+    waste_classifier.ready_event.wait()
+    if not waste_classifier.is_ready():
+        # ready_event is also set when loading failed; benchmarking that measures error responses
+        raise SystemExit(f"❌ Model is not ready (state: {waste_classifier.state}); nothing to benchmark")
+    return waste_classifier
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(port, with_cache, timeout=300):
+    """Start the app in a child process and wait until /readyz reports ready"""
+    code = ("from app import create_app; "
+            f"create_app().run(host='127.0.0.1', port={port}, threaded=True, use_reloader=False)")
+    env = dict(os.environ)
+    if not with_cache:
+        env['PREDICTION_CACHE_BACKEND'] = 'none'
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Benchmark server exited during startup")
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/readyz', timeout=2) as response:
+                if response.status == 200:
+                    return process
+        except Exception:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Benchmark server did not become ready")
+
+
+def http_poster(url):
+    def post(filename, data):
+        body, content_type = encode_multipart(filename, data)
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                body = response.read()
+                return response.status, classified(response.status, body), response.headers.get('Server-Timing')
+        except urllib.error.HTTPError as e:
+            return e.code, False, e.headers.get('Server-Timing')
+    return post
+
+
+def test_client_poster():
+    from app import create_app
+    app = create_app()
+    require_model()
+    local = threading.local()
+
+    def post(filename, data):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        response = client.post('/classify', data={'file': (io.BytesIO(data), filename)})
+        return (response.status_code, classified(response.status_code, response.get_data()),
+                response.headers.get('Server-Timing'))
+    return post
+
+
+def environment():
+    from config import Config
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        commit = None
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'inference_backend': Config.INFERENCE_BACKEND,
+        'batching_enabled': Config.BATCHING_ENABLED,
+        'batch_max_size': Config.BATCH_MAX_SIZE,
+        'batch_max_wait_ms': Config.BATCH_MAX_WAIT_MS,
+        'prediction_cache': Config.PREDICTION_CACHE_BACKEND
+    }
+
+
+def compare(base_path, run_path):
+    """Print p50/p95/p99 and throughput deltas between two result files"""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(run_path) as f:
+        run = json.load(f)
+    rows = [('end_to_end', base['end_to_end'], run['end_to_end'])]
+    rows += [(stage, base['stages'].get(stage, {}), run['stages'].get(stage, {}))
+             for stage in STAGES if 'stages' in base and 'stages' in run]
+    for name, old, new in rows:
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            if metric in old and metric in new and old[metric]:
+                change = (new[metric] - old[metric]) / old[metric] * 100
+                print(f"{name:>14} {metric:>15}: {old[metric]:>10.2f} -> {new[metric]:>10.2f} ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test and latency benchmark for /classify")
+    parser.add_argument('--dataset', default=os.path.join(ROOT, 'dataset'))
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--spawn', action='store_true', help="Benchmark a locally spawned HTTP server")
+    parser.add_argument('--url', help="Benchmark an already running server, e.g. http://127.0.0.1:5000/classify")
+    parser.add_argument('--with-cache', action='store_true',
+                        help="Keep the prediction cache on (off by default so repeated images are measured)")
+    parser.add_argument('--no-stages', action='store_true', help="Skip the in-process per-stage breakdown")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'RUN'), help="Compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    os.chdir(ROOT)
+    images = sample_images(args.dataset, args.requests, args.seed)
+    if not args.with_cache:
+        from app.models import waste_classifier
+        waste_classifier.cache = None
+    process = None
+    try:
+        if args.url:
+            mode, post = 'http', http_poster(args.url)
+        elif args.spawn:
+            port = free_port()
+            process = spawn_server(port, args.with_cache)
+            mode, post = 'spawned', http_poster(f'http://127.0.0.1:{port}/classify')
+        else:
+            mode, post = 'in_process', test_client_poster()
+
+        results = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'mode': mode,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+            'prediction_cache': args.with_cache,
+            'environment': environment(),
+            'end_to_end': bench_end_to_end(post, images, args.concurrency, args.warmup)
+        }
+        if not args.no_stages:
+            # The stage breakdown always runs in this process, next to the HTTP run if any
+            require_model()
+            results['stages'] = bench_stages(images, args.concurrency)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(json.dumps(results, indent=2))
+    if results['end_to_end']['failures']:
+        print(f"⚠️ {results['end_to_end']['failures']} of {args.requests} requests failed; "
+              f"see end_to_end.status_codes")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,116 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'ecosort-ai-secret-key-2025'
     UPLOAD_FOLDER = 'app/static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    # Uploads up to this size are parsed, held and decoded in memory (also the ASGI body
+    # spool limit); larger ones are spooled to a temporary file and then UPLOAD_FOLDER
+    IN_MEMORY_UPLOAD_MAX_BYTES = int(os.environ.get('IN_MEMORY_UPLOAD_MAX_BYTES', 8 * 1024 * 1024))
     
     # Model configuration
     MODEL_PATH = 'app/ml_model/saved_model.h5'
     IMAGE_SIZE = (224, 224)
     
+    # Preprocessing: DCT-domain JPEG downscaling and parallel batch decode
+    FAST_JPEG_DECODE = os.environ.get('FAST_JPEG_DECODE', '1') == '1'
+    PREPROCESS_WORKERS = int(os.environ.get('PREPROCESS_WORKERS', 0)) or None
+    # Optional CLAHE + blur enhancement (low-light captures). Serving default, overridable
+    # per request with `enhance=1|0`; training runs use ENHANCE_TRAINING_IMAGES.
+    ENHANCE_IMAGES = os.environ.get('ENHANCE_IMAGES', '0') == '1'
+    ENHANCE_TRAINING_IMAGES = os.environ.get('ENHANCE_TRAINING_IMAGES', '0') == '1'
+    
+    # Start loading and warming up the model in the background as soon as the app is created
+    MODEL_LOAD_AT_STARTUP = os.environ.get('MODEL_LOAD_AT_STARTUP', '1') == '1'
+    
+    # Inference runtime: 'keras', 'tflite', 'tflite_fp16', 'tflite_int8' or 'onnx'.
+    # Non-Keras variants are produced by `python -m app.ml_model.export_model`.
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras')
+    EXPORT_DIR = 'app/ml_model/exported'
+    MODEL_VARIANTS = {
+        'keras': MODEL_PATH,
+        'tflite': os.path.join(EXPORT_DIR, 'model_fp32.tflite'),
+        'tflite_fp16': os.path.join(EXPORT_DIR, 'model_fp16.tflite'),
+        'tflite_int8': os.path.join(EXPORT_DIR, 'model_int8.tflite'),
+        'onnx': os.path.join(EXPORT_DIR, 'model.onnx')
+    }
+    # When set, web workers send preprocessed tensors to `python -m app.inference_server`
+    # on this Unix socket instead of loading the model themselves
+    INFERENCE_SERVER_SOCKET = os.environ.get('INFERENCE_SERVER_SOCKET', '')
+    INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', 0)) or None
+    # Versioned models: MODEL_STORE_DIR/<version>/ holds a published model and manifest.json
+    # names the active version plus an optional canary/shadow candidate
+    # (`python -m app.model_store`). Workers poll the manifest every MODEL_RELOAD_INTERVAL
+    # seconds and hot-swap without a restart (0 disables). Without a manifest MODEL_PATH is served.
+    MODEL_STORE_DIR = os.environ.get('MODEL_STORE_DIR', 'app/ml_model/versions')
+    MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 5))
+    # Exported variants must agree with the Keras model's top-1 on this share of held-out images
+    EXPORT_MIN_AGREEMENT = float(os.environ.get('EXPORT_MIN_AGREEMENT', 0.98))
+    
+    # Inference batching: concurrent requests are merged into one forward pass
+    BATCHING_ENABLED = os.environ.get('BATCHING_ENABLED', '1') == '1'
+    BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 16))
+    BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+    
+    # Prediction cache keyed by sha256(upload bytes) + model version.
+    # 'memory' is per worker, 'sqlite' is shared by all workers on the host, 'none' disables it.
+    PREDICTION_CACHE_BACKEND = os.environ.get('PREDICTION_CACHE_BACKEND', 'memory')
+    PREDICTION_CACHE_PATH = os.environ.get('PREDICTION_CACHE_PATH', 'cache/predictions.sqlite3')
+    PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES', 10000))
+    PREDICTION_CACHE_TTL = int(os.environ.get('PREDICTION_CACHE_TTL', 24 * 3600))
+    
+    # Admission control for /classify and /classify/batch (per worker process).
+    # Requests beyond MAX_PENDING_REQUESTS get 503, clients over their token bucket
+    # (RATE_LIMIT_PER_SECOND refill, RATE_LIMIT_BURST size) get 429, both with Retry-After.
+    # Inference is skipped for requests older than REQUEST_DEADLINE_MS; clients can ask for
+    # a shorter deadline with an X-Request-Deadline-Ms header. 0 disables each limit.
+    MAX_PENDING_REQUESTS = int(os.environ.get('MAX_PENDING_REQUESTS', 64))
+    RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', 0))
+    RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 20))
+    # Identify clients by the first X-Forwarded-For hop (only behind a trusted proxy)
+    RATE_LIMIT_TRUST_FORWARDED = os.environ.get('RATE_LIMIT_TRUST_FORWARDED', '0') == '1'
+    REQUEST_DEADLINE_MS = float(os.environ.get('REQUEST_DEADLINE_MS', 10000))
+    OVERLOAD_RETRY_AFTER = int(os.environ.get('OVERLOAD_RETRY_AFTER', 1))
+    
+    # /classify/batch: images are preprocessed and classified in chunks of this size
+    BATCH_ENDPOINT_CHUNK_SIZE = int(os.environ.get('BATCH_ENDPOINT_CHUNK_SIZE', 16))
+    BATCH_ENDPOINT_MAX_FILES = int(os.environ.get('BATCH_ENDPOINT_MAX_FILES', 256))
+
+    # /classify response defaults, overridable per request with ?image= and ?recycling_info=.
+    # image: 'full' echoes the upload as base64, 'thumbnail' a small JPEG made from the
+    # decoded image, 'none' leaves it out. recycling_info: 'inline' embeds it, 'ref' links
+    # to the cacheable /recycling-info instead.
+    RESPONSE_IMAGE_MODE = os.environ.get('RESPONSE_IMAGE_MODE', 'full')
+    RESPONSE_RECYCLING_INFO = os.environ.get('RESPONSE_RECYCLING_INFO', 'inline')
+    THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', 160))
+    THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', 75))
+    RECYCLING_INFO_MAX_AGE = int(os.environ.get('RECYCLING_INFO_MAX_AGE', 3600))
+    
+    # The web UI resizes photos to IMAGE_SIZE in the browser (nearest-neighbour, like the
+    # server) and uploads them as WebP (JPEG where unsupported) at this quality; the server
+    # then skips the resize. Measure a change with `evaluate --preprocessing client_resize`
+    CLIENT_UPLOAD_QUALITY = float(os.environ.get('CLIENT_UPLOAD_QUALITY', 0.9))
+    
+    # Threads running the Flask app under the ASGI entry point (`uvicorn asgi:app`)
+    ASGI_WORKER_THREADS = int(os.environ.get('ASGI_WORKER_THREADS', 8))
+    
+    # Camera streaming over the `/ws/classify` WebSocket (ASGI entry point only).
+    # Only the newest waiting frame is classified; a frame whose 16x16 grayscale
+    # signature differs from the last classified one by less than STREAM_DUPLICATE_THRESHOLD
+    # (mean absolute difference, 0-255) reuses its result, and predictions are averaged
+    # over the last STREAM_SMOOTHING_WINDOW classified frames.
+    STREAM_MAX_CONNECTIONS = int(os.environ.get('STREAM_MAX_CONNECTIONS', 16))
+    STREAM_MAX_FRAME_BYTES = int(os.environ.get('STREAM_MAX_FRAME_BYTES', 512 * 1024))
+    STREAM_DUPLICATE_THRESHOLD = float(os.environ.get('STREAM_DUPLICATE_THRESHOLD', 3.0))
+    STREAM_SMOOTHING_WINDOW = int(os.environ.get('STREAM_SMOOTHING_WINDOW', 5))
+    # Frames per second the browser's camera mode sends at most
+    STREAM_CLIENT_FPS = float(os.environ.get('STREAM_CLIENT_FPS', 8))
+    
+    # Static assets fingerprinted and precompressed by `python -m app.assets`, served with
+    # immutable cache headers. Rendered HTML pages are cached per worker and revalidated
+    # with their ETag (PAGE_CACHE_ENABLED=0 re-renders on every request).
+    ASSETS_DIST_DIR = 'app/static/dist'
+    ASSETS_MAX_AGE = 365 * 24 * 3600
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', '1') == '1'
+
     # Waste categories
     WASTE_CATEGORIES = {
         0: 'Cardboard',